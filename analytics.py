@@ -0,0 +1,207 @@
+"""Cohort-wide recruitment and completeness numbers for the study coordinators.
+
+Working these out from the recordings on every request would read the whole
+cohort. Instead each patient's aggregates are materialised in patient_summary
+and patient_field_summary: writes call refresh_patients() for the patients
+they touch, inside their own transaction, so the cohort numbers are sums over
+one row per patient. Those are kept in a per-process cache for
+``ANALYTICS_CACHE_TTL`` seconds; a write invalidates this process's entry at
+once, other worker processes see it when their entry expires.
+"""
+import datetime
+import threading
+import time
+
+from flask import current_app
+
+from completeness import REQUIRED_FIELDS_BY_TYPE
+from models import Observation, PatientFieldSummary, PatientSummary, Recording, RecordingAudio, db
+
+DEFAULT_TTL = 300
+
+# (recording_type, field) pairs the completeness heatmap covers. The recording
+# type is always present on a recording of that type, so it is left out.
+REQUIRED_PAIRS = [
+    (recording_type, field)
+    for recording_type, fields in REQUIRED_FIELDS_BY_TYPE.items()
+    for field in fields if field != 'recording_type'
+]
+
+_cache = {}
+_cache_lock = threading.Lock()
+_generation = 0  # bumped by invalidate(), so a result computed across a write is not cached
+
+
+def _kccq(recording_type, newest):
+    """Overall KCCQ summary of the patient's first (or, ``newest``, last) recording of a type."""
+    other = db.aliased(Recording)
+    order = [other.date.desc(), other.id.desc()] if newest else [other.date, other.id]
+    return db.select(other.kccq_overall_summary).where(
+        other.patient_id == Recording.patient_id,
+        other.recording_type == recording_type,
+        other.kccq_overall_summary.is_not(None),
+    ).order_by(*order).limit(1).scalar_subquery()
+
+
+def _summary_select(patient_ids):
+    admission = db.aliased(Observation)
+    discharge = db.aliased(Observation)
+    admission_date = db.func.min(admission.value)
+    discharge_date = db.func.max(discharge.value)
+    by_type = {recording_type: db.func.count().filter(Recording.recording_type == recording_type)
+               for recording_type in ('admission', 'daily', 'discharge')}
+    select = db.select(
+        Recording.patient_id,
+        db.func.count(),
+        db.func.count().filter(Recording.is_complete),
+        by_type['admission'],
+        by_type['daily'],
+        by_type['discharge'],
+        admission_date,
+        discharge_date,
+        db.cast(db.func.julianday(discharge_date) - db.func.julianday(admission_date), db.Integer),
+        _kccq('admission', newest=False),
+        _kccq('discharge', newest=True),
+    ).outerjoin(admission, db.and_(admission.recording_id == Recording.id, admission.code == 'admission_date')
+    ).outerjoin(discharge, db.and_(discharge.recording_id == Recording.id, discharge.code == 'discharge_date')
+    ).group_by(Recording.patient_id)
+    if patient_ids is not None:
+        select = select.where(Recording.patient_id.in_(patient_ids))
+    return select
+
+
+def _field_summary_select(patient_ids):
+    required = db.values(
+        db.column('recording_type', db.String), db.column('field', db.String), name='required_field'
+    ).data(REQUIRED_PAIRS).cte('required_field')
+    # Empty and 0 count as missing, as in completeness.missing_fields()
+    present = db.or_(
+        db.exists().where(Observation.recording_id == Recording.id, Observation.code == required.c.field,
+                          Observation.value.not_in(['', 0])),
+        db.exists().where(RecordingAudio.recording_id == Recording.id, RecordingAudio.kind == required.c.field),
+        db.and_(required.c.field == 'hospitalization_day', db.func.coalesce(Recording.hospitalization_day, 0) != 0),
+    )
+    missing = db.func.count().filter(~present)
+    select = db.select(
+        Recording.patient_id, Recording.recording_type, required.c.field, missing
+    ).join(required, required.c.recording_type == Recording.recording_type).group_by(
+        Recording.patient_id, Recording.recording_type, required.c.field
+    ).having(missing > 0)
+    if patient_ids is not None:
+        select = select.where(Recording.patient_id.in_(patient_ids))
+    return select
+
+
+def refresh_patients(patient_ids=None):
+    """Recompute the summary rows of ``patient_ids`` (every patient if None) in the current transaction.
+
+    Patients without recordings are left without rows. Call invalidate() once
+    the transaction is committed.
+    """
+    if patient_ids is not None:
+        patient_ids = sorted(patient_ids)
+        if not patient_ids:
+            return
+    db.session.flush()
+    for model in (PatientSummary, PatientFieldSummary):
+        delete = db.delete(model)
+        if patient_ids is not None:
+            delete = delete.where(model.patient_id.in_(patient_ids))
+        db.session.execute(delete)
+    db.session.execute(db.insert(PatientSummary).from_select([
+        'patient_id', 'recordings', 'complete_recordings', 'admission_recordings', 'daily_recordings',
+        'discharge_recordings', 'admission_date', 'discharge_date', 'stay_days', 'kccq_admission', 'kccq_discharge',
+    ], _summary_select(patient_ids)))
+    db.session.execute(db.insert(PatientFieldSummary).from_select(
+        ['patient_id', 'recording_type', 'field', 'missing'], _field_summary_select(patient_ids)))
+
+
+def invalidate():
+    """Drop the cached cohort numbers of this process."""
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        _cache.clear()
+
+
+def _median(column):
+    count = db.session.scalar(db.select(db.func.count(column)))
+    if not count:
+        return None
+    # The middle value, or the mean of the middle two, read through the sort in SQL
+    middle = db.select(column.label('value')).where(column.is_not(None)).order_by(column).limit(
+        2 - count % 2).offset((count - 1) // 2).subquery()
+    return db.session.scalar(db.select(db.func.avg(middle.c.value)))
+
+
+def _rounded(value):
+    return None if value is None else round(value, 2)
+
+
+def _compute():
+    summary = PatientSummary
+    kccq_change = summary.kccq_discharge - summary.kccq_admission
+    totals = db.session.execute(db.select(
+        db.func.count().label('patients'),
+        db.func.coalesce(db.func.sum(summary.recordings), 0).label('recordings'),
+        db.func.coalesce(db.func.sum(summary.complete_recordings), 0).label('complete_recordings'),
+        *[db.func.count().filter(getattr(summary, f'{recording_type}_recordings') > 0).label(f'{recording_type}_patients')
+          for recording_type in REQUIRED_FIELDS_BY_TYPE],
+        *[db.func.coalesce(db.func.sum(getattr(summary, f'{recording_type}_recordings')), 0).label(
+            f'{recording_type}_recordings') for recording_type in REQUIRED_FIELDS_BY_TYPE],
+        db.func.count(summary.stay_days).label('stays'),
+        db.func.avg(summary.stay_days).label('stay_mean'),
+        db.func.count(kccq_change).label('kccq_pairs'),
+        db.func.avg(summary.kccq_admission).filter(kccq_change.is_not(None)).label('kccq_admission_mean'),
+        db.func.avg(summary.kccq_discharge).filter(kccq_change.is_not(None)).label('kccq_discharge_mean'),
+        db.func.avg(kccq_change).label('kccq_change_mean'),
+    )).mappings().one()
+
+    missing = {(row.recording_type, row.field): row.missing for row in db.session.execute(
+        db.select(PatientFieldSummary.recording_type, PatientFieldSummary.field,
+                  db.func.sum(PatientFieldSummary.missing).label('missing'))
+        .group_by(PatientFieldSummary.recording_type, PatientFieldSummary.field)
+    )}
+    heatmap = {}
+    for recording_type, field in REQUIRED_PAIRS:
+        recordings = totals[f'{recording_type}_recordings']
+        count = missing.get((recording_type, field), 0)
+        heatmap.setdefault(recording_type, {})[field] = {
+            'missing': count, 'rate': round(count / recordings, 4) if recordings else None}
+
+    return {
+        'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'patients': totals['patients'],
+        'recordings': totals['recordings'],
+        'complete_recordings': totals['complete_recordings'],
+        'recording_types': {
+            recording_type: {'patients': totals[f'{recording_type}_patients'],
+                             'recordings': totals[f'{recording_type}_recordings']}
+            for recording_type in REQUIRED_FIELDS_BY_TYPE
+        },
+        'stay_days': {'n': totals['stays'], 'median': _median(summary.stay_days), 'mean': _rounded(totals['stay_mean'])},
+        'kccq_change': {
+            'n': totals['kccq_pairs'],
+            'admission_mean': _rounded(totals['kccq_admission_mean']),
+            'discharge_mean': _rounded(totals['kccq_discharge_mean']),
+            'mean': _rounded(totals['kccq_change_mean']),
+            'median': _rounded(_median(kccq_change)),
+        },
+        'missing_fields': heatmap,
+    }
+
+
+def cohort_analytics():
+    """The cohort numbers, from the cache while they are younger than ``ANALYTICS_CACHE_TTL`` seconds."""
+    ttl = current_app.config.get('ANALYTICS_CACHE_TTL', DEFAULT_TTL)
+    key = str(db.engine.url)
+    with _cache_lock:
+        entry = _cache.get(key)
+        generation = _generation
+    if entry is not None and time.monotonic() - entry[0] < ttl:
+        return entry[1]
+    analytics = _compute()
+    with _cache_lock:
+        if _generation == generation:
+            _cache[key] = (time.monotonic(), analytics)
+    return analytics
@@ -0,0 +1,90 @@
+"""Normalise one uploaded clip into the canonical stored format.
+
+The upload is decoded exactly once. The decoded samples are checked, used for
+the voice features and waveform peaks, and encoded into a mono 16 kHz Opus
+(or FLAC) rendition. Like voice_features, this runs in a worker process
+without an app context; the filesystem audio store is passed in.
+Decoding anything but PCM WAV, and all encoding, needs ffmpeg on the PATH.
+"""
+import json
+import subprocess
+import wave
+
+import numpy as np
+
+import voice_features
+
+CANONICAL_SAMPLE_RATE = 16000
+PEAK_BUCKETS = 400
+
+# Format name -> (mime type, ffmpeg output arguments)
+CANONICAL_FORMATS = {
+    'opus': ('audio/ogg', ['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip', '-f', 'ogg']),
+    'flac': ('audio/flac', ['-c:a', 'flac', '-sample_fmt', 's16', '-f', 'flac']),
+}
+
+
+class InvalidAudio(Exception):
+    """The clip decoded, but is unusable (too short, too long, too low a sample rate). Not worth retrying."""
+
+
+def probe(path):
+    """Return ``{'sample_rate', 'channels'}`` of the file as recorded, without decoding it."""
+    with open(path, 'rb') as f:
+        is_wav = f.read(4) == b'RIFF'
+    if is_wav:
+        with wave.open(path, 'rb') as w:
+            return {'sample_rate': w.getframerate(), 'channels': w.getnchannels()}
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'a:0', '-show_entries', 'stream=sample_rate,channels',
+         '-of', 'json', path],
+        capture_output=True, check=True
+    )
+    streams = json.loads(result.stdout).get('streams') or []
+    if not streams:
+        raise InvalidAudio('No audio stream')
+    return {'sample_rate': int(streams[0]['sample_rate']), 'channels': int(streams[0]['channels'])}
+
+
+def waveform_peaks(samples, buckets=PEAK_BUCKETS):
+    """Peak absolute amplitude (0-1) of ``buckets`` equal slices of the clip, for drawing a waveform."""
+    samples = np.abs(np.asarray(samples, dtype=np.float32))
+    if len(samples) == 0:
+        return []
+    buckets = min(buckets, len(samples))
+    padded = np.pad(samples, (0, -len(samples) % buckets))
+    peaks = padded.reshape(buckets, -1).max(axis=1)
+    return [round(float(peak), 3) for peak in np.clip(peaks, 0.0, 1.0)]
+
+
+def encode(samples, sample_rate, fmt):
+    """Encode mono float samples into the canonical format; returns ``(bytes, mime)``."""
+    mime, output_args = CANONICAL_FORMATS[fmt]
+    result = subprocess.run(
+        ['ffmpeg', '-nostdin', '-v', 'error', '-f', 'f32le', '-ar', str(sample_rate), '-ac', '1', '-i', '-',
+         '-ar', str(CANONICAL_SAMPLE_RATE), '-ac', '1'] + output_args + ['-'],
+        input=np.asarray(samples, dtype='<f4').tobytes(), capture_output=True, check=True
+    )
+    return result.stdout, mime
+
+
+def process_clip(path, store, fmt='opus', min_seconds=1.0, max_seconds=600.0, min_sample_rate=8000):
+    """Validate, analyse and re-encode the clip at ``path``.
+
+    Returns a dict with the voice ``features``, the recorded ``sample_rate`` and
+    ``channels``, waveform ``peaks`` and the canonical rendition's ``sha256``,
+    ``size`` and ``mime`` (already written to ``store``).
+    """
+    info = probe(path)
+    if info['sample_rate'] < min_sample_rate:
+        raise InvalidAudio(f"Sample rate {info['sample_rate']} Hz is below {min_sample_rate} Hz")
+
+    samples, sample_rate = voice_features.decode(path, CANONICAL_SAMPLE_RATE)
+    duration = len(samples) / float(sample_rate)
+    if not min_seconds <= duration <= max_seconds:
+        raise InvalidAudio(f'Duration {duration:.1f}s is outside {min_seconds:g}-{max_seconds:g}s')
+
+    data, mime = encode(samples, sample_rate, fmt)
+    digest, size = store.put(data)
+    return dict(info, features=voice_features.compute_features(samples, sample_rate),
+                peaks=waveform_peaks(samples), sha256=digest, size=size, mime=mime)
@@ -0,0 +1,149 @@
+"""SQLite-backed job queue for audio post-processing.
+
+Jobs are claimed and written back by a single coordinating process; the
+CPU-heavy work (decoding, feature extraction and re-encoding into the
+canonical format, see audio_ingest.py) runs in a process pool.
+"""
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from flask import current_app
+
+from audio_store import FileSystemAudioStore, get_store
+from models import AudioJob, RecordingAudio, VoiceFeatures, db
+import audio_ingest
+
+MAX_ATTEMPTS = 3
+# A failed attempt is retried after RETRY_DELAY, doubled after each further attempt
+RETRY_DELAY = datetime.timedelta(minutes=1)
+
+
+def claim_jobs(limit):
+    """Atomically mark up to ``limit`` queued jobs that are due as running and return ``(job_id, audio_id)`` pairs."""
+    now = datetime.datetime.now()
+    queued = db.select(AudioJob.id).where(
+        AudioJob.status == 'queued', db.or_(AudioJob.not_before.is_(None), AudioJob.not_before <= now)
+    ).order_by(AudioJob.id).limit(limit)
+    claimed = db.session.execute(
+        db.update(AudioJob)
+        .where(AudioJob.id.in_(queued.scalar_subquery()))
+        .values(status='running', started_at=now, attempts=AudioJob.attempts + 1)
+        .returning(AudioJob.id, AudioJob.audio_id)
+    ).all()
+    db.session.commit()
+    return claimed
+
+
+def requeue_stale(older_than):
+    """Put jobs back in the queue whose worker died while running them."""
+    cutoff = datetime.datetime.now() - older_than
+    result = db.session.execute(
+        db.update(AudioJob)
+        .where(AudioJob.status == 'running', AudioJob.started_at < cutoff)
+        .values(status='queued')
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def _audio_paths(store, audio_ids):
+    """Path of the bytes each clip was uploaded as (or of its rendition if the original was dropped)."""
+    source = db.func.coalesce(RecordingAudio.original_sha256, RecordingAudio.sha256)
+    rows = db.session.query(RecordingAudio.id, source).filter(RecordingAudio.id.in_(audio_ids))
+    return {audio_id: store.path(digest) for audio_id, digest in rows if store.exists(digest)}
+
+
+def _finish(job_id, audio_id, result=None, error=None, permanent=False):
+    """Write back one attempt and return the job's new status (None if the job is gone)."""
+    job = db.session.get(AudioJob, job_id)
+    clip = db.session.get(RecordingAudio, audio_id)
+    # The recording was deleted while its clip was processed; ON DELETE CASCADE took the job with it
+    if job is None or clip is None:
+        db.session.rollback()
+        return None
+    job.finished_at = datetime.datetime.now()
+    dropped = None
+    if error is None:
+        job.status = 'done'
+        job.error = None
+        features = result['features']
+        row = VoiceFeatures.query.filter_by(audio_id=audio_id).first() or VoiceFeatures(audio_id=audio_id)
+        for name, value in features.items():
+            setattr(row, name, value)
+        row.computed_at = job.finished_at
+        db.session.add(row)
+
+        if clip.original_sha256 is None and clip.sha256 != result['sha256']:
+            if current_app.config['AUDIO_KEEP_ORIGINAL']:
+                clip.original_sha256, clip.original_size, clip.original_mime = clip.sha256, clip.size, clip.mime
+            else:
+                dropped = clip.sha256
+        clip.sha256, clip.size, clip.mime = result['sha256'], result['size'], result['mime']
+        clip.duration = features['duration']
+        clip.sample_rate = result['sample_rate']
+        clip.channels = result['channels']
+        clip.peaks = result['peaks']
+    else:
+        job.status = 'queued' if job.attempts < MAX_ATTEMPTS and not permanent else 'failed'
+        job.error = error
+        if job.status == 'queued':
+            job.not_before = job.finished_at + RETRY_DELAY * 2 ** (job.attempts - 1)
+    status = job.status
+    db.session.commit()
+
+    # Only delete the received bytes once nothing refers to them any more
+    if dropped and not db.session.query(db.exists().where(db.or_(
+            RecordingAudio.sha256 == dropped, RecordingAudio.original_sha256 == dropped))).scalar():
+        get_store().delete(dropped)
+    return status
+
+
+def run_worker(workers=None, batch_size=16, poll_interval=2.0, once=False):
+    """Process queued jobs until interrupted (or until no queued job is due with ``once``).
+
+    Returns the number of jobs finished, done or failed; a job waiting for its
+    next attempt is counted once it finishes.
+    """
+    handled = 0
+    requeue_stale(datetime.timedelta(hours=1))
+    store = get_store()
+    if not isinstance(store, FileSystemAudioStore):
+        raise RuntimeError('The audio worker needs a filesystem audio store')
+    config = current_app.config
+    options = {
+        'fmt': config['AUDIO_CANONICAL_FORMAT'],
+        'min_seconds': config['AUDIO_MIN_SECONDS'],
+        'max_seconds': config['AUDIO_MAX_SECONDS'],
+        'min_sample_rate': config['AUDIO_MIN_SAMPLE_RATE'],
+    }
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        while True:
+            claimed = claim_jobs(batch_size)
+            if not claimed:
+                if once:
+                    return handled
+                time.sleep(poll_interval)
+                continue
+
+            paths = _audio_paths(store, [audio_id for _, audio_id in claimed])
+            futures = {}
+            statuses = []
+            for job_id, audio_id in claimed:
+                if audio_id in paths:
+                    future = pool.submit(audio_ingest.process_clip, paths[audio_id], store, **options)
+                    futures[future] = (job_id, audio_id)
+                else:
+                    statuses.append(_finish(job_id, audio_id, error='Audio clip no longer exists', permanent=True))
+            for future in as_completed(futures):
+                job_id, audio_id = futures[future]
+                try:
+                    statuses.append(_finish(job_id, audio_id, result=future.result()))
+                except audio_ingest.InvalidAudio as exc:
+                    db.session.rollback()
+                    statuses.append(_finish(job_id, audio_id, error=str(exc), permanent=True))
+                except Exception as exc:
+                    db.session.rollback()
+                    statuses.append(_finish(job_id, audio_id, error=f'{type(exc).__name__}: {exc}'))
+            handled += sum(status in ('done', 'failed') for status in statuses)
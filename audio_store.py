@@ -0,0 +1,317 @@
+import abc
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+from flask import current_app
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+CHUNK_SIZE = 64 * 1024
+
+
+class AudioTooLarge(Exception):
+    def __init__(self, max_size):
+        super().__init__(f'Audio sample exceeds {max_size} bytes')
+        self.max_size = max_size
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+class UploadOffsetMismatch(Exception):
+    """A chunk did not start where the stored part of the upload ends."""
+
+    def __init__(self, offset):
+        super().__init__(f'Upload continues at byte {offset}')
+        self.offset = offset
+
+
+class AudioStore(abc.ABC):
+    """Content-addressed storage for audio samples, keyed by SHA-256 hex digest."""
+
+    def put(self, data):
+        """Store ``data`` and return ``(digest, size)``. Storing the same bytes twice is a no-op."""
+        return self.put_stream(io.BytesIO(data))
+
+    @abc.abstractmethod
+    def put_stream(self, stream, max_size=None):
+        """Like :meth:`put`, but reads ``stream`` in chunks. Raises :class:`AudioTooLarge` past ``max_size``."""
+
+    @abc.abstractmethod
+    def open(self, digest):
+        """Return a binary file object for the stored sample."""
+
+    @abc.abstractmethod
+    def exists(self, digest):
+        """Whether a sample with ``digest`` is stored."""
+
+    @abc.abstractmethod
+    def delete(self, digest):
+        """Remove the sample; deleting one that is not stored is a no-op."""
+
+    # Resumable uploads: a clip arrives in chunks over several requests and only
+    # becomes a content-addressed sample once complete_upload() is called.
+
+    @abc.abstractmethod
+    def create_upload(self, **meta):
+        """Start an upload and return its id. ``meta`` (e.g. kind, mime) is kept with it."""
+
+    @abc.abstractmethod
+    def upload_info(self, upload_id):
+        """Return the upload's meta plus ``offset`` (bytes stored), and ``sha256``/``size`` once complete."""
+
+    @abc.abstractmethod
+    def append_upload(self, upload_id, offset, stream, max_size=None):
+        """Write ``stream`` at ``offset`` and return the new offset.
+
+        Re-sending bytes the store already has is allowed (they are overwritten),
+        leaving a gap raises :class:`UploadOffsetMismatch`.
+        """
+
+    @abc.abstractmethod
+    def complete_upload(self, upload_id):
+        """Move the assembled upload into the store and return ``(digest, size)``."""
+
+    @abc.abstractmethod
+    def discard_upload(self, upload_id):
+        """Remove the upload's leftovers; the sample it completed into stays."""
+
+    @abc.abstractmethod
+    def collect_garbage(self, referenced, min_age=24 * 3600):
+        """Delete samples whose digest is not in ``referenced`` and abandoned uploads.
+
+        Anything modified within the last ``min_age`` seconds is kept: a request may
+        have stored a sample without having committed the row that references it.
+        Returns ``(files, bytes)`` removed.
+        """
+
+
+class FileSystemAudioStore(AudioStore):
+    """Stores each sample as ``<root>/ab/cd/abcd...`` so no directory grows too large."""
+
+    def __init__(self, root, depth=2, width=2):
+        self.root = root
+        self.depth = depth
+        self.width = width
+
+    def path(self, digest):
+        if not _DIGEST_RE.match(digest or ''):
+            raise ValueError(f'Invalid audio digest: {digest!r}')
+        shards = [digest[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+        return os.path.join(self.root, *shards, digest)
+
+    def put_stream(self, stream, max_size=None):
+        # Stage inside the store so the final rename stays on one filesystem and is atomic
+        staging = os.path.join(self.root, '.staging')
+        os.makedirs(staging, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=staging)
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise AudioTooLarge(max_size)
+                    sha256.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+            digest = sha256.hexdigest()
+            path = self.path(digest)
+            if _touch(path):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return digest, size
+
+    def open(self, digest):
+        return open(self.path(digest), 'rb')
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def delete(self, digest):
+        try:
+            os.unlink(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def _upload_path(self, upload_id):
+        if not _UPLOAD_ID_RE.match(upload_id or ''):
+            raise UploadNotFound(upload_id)
+        return os.path.join(self.root, '.uploads', upload_id)
+
+    def _write_upload_info(self, upload_id, info):
+        path = self._upload_path(upload_id) + '.json'
+        with open(path + '.tmp', 'w') as f:
+            json.dump(info, f)
+        os.replace(path + '.tmp', path)
+
+    def create_upload(self, **meta):
+        upload_id = uuid.uuid4().hex
+        path = self._upload_path(upload_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'xb').close()
+        self._write_upload_info(upload_id, meta)
+        return upload_id
+
+    def upload_info(self, upload_id):
+        path = self._upload_path(upload_id)
+        try:
+            with open(path + '.json') as f:
+                info = json.load(f)
+        except FileNotFoundError:
+            raise UploadNotFound(upload_id)
+        info['upload_id'] = upload_id
+        info['complete'] = 'sha256' in info
+        info['offset'] = info['size'] if info['complete'] else os.path.getsize(path)
+        return info
+
+    def append_upload(self, upload_id, offset, stream, max_size=None):
+        info = self.upload_info(upload_id)
+        if info['complete'] or offset > info['offset']:
+            raise UploadOffsetMismatch(info['offset'])
+        with open(self._upload_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            size = offset
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    # Drop what this request wrote, so the offset never counts a partial chunk as stored
+                    f.truncate(offset)
+                    raise AudioTooLarge(max_size)
+                f.write(chunk)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        return size
+
+    def complete_upload(self, upload_id):
+        info = self.upload_info(upload_id)
+        if info['complete']:
+            return info['sha256'], info['size']
+        path = self._upload_path(upload_id)
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        target = self.path(digest)
+        if _touch(target):
+            os.unlink(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        meta = {key: value for key, value in info.items() if key not in ('upload_id', 'complete', 'offset')}
+        self._write_upload_info(upload_id, dict(meta, sha256=digest, size=info['offset']))
+        return digest, info['offset']
+
+    def discard_upload(self, upload_id):
+        path = self._upload_path(upload_id)
+        for leftover in (path, path + '.json'):
+            try:
+                os.unlink(leftover)
+            except FileNotFoundError:
+                pass
+
+    def collect_garbage(self, referenced, min_age=24 * 3600):
+        cutoff = time.time() - min_age
+        keep = set(referenced)
+        removed = [0, 0]
+
+        def remove_stale(path):
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime >= cutoff:
+                    return
+                os.unlink(path)
+            except FileNotFoundError:
+                return
+            removed[0] += 1
+            removed[1] += stat.st_size
+
+        # Uploads first: a recently completed one is about to be referenced by a recording
+        uploads = os.path.join(self.root, '.uploads')
+        for entry in _scandir(uploads):
+            if entry.name.endswith('.json'):
+                upload_id = entry.name[:-len('.json')]
+                data_path = os.path.join(uploads, upload_id)
+                if max(entry.stat().st_mtime, os.path.getmtime(data_path) if os.path.exists(data_path) else 0) >= cutoff:
+                    try:
+                        keep.add(self.upload_info(upload_id).get('sha256'))
+                    except UploadNotFound:
+                        pass  # discarded meanwhile
+                else:
+                    remove_stale(data_path)
+                    remove_stale(entry.path)
+            elif not os.path.exists(entry.path + '.json'):
+                # Chunks without a sidecar, or a sidecar write that never got renamed
+                remove_stale(entry.path)
+        # Left behind by interrupted put_stream() calls
+        for entry in _scandir(os.path.join(self.root, '.staging')):
+            remove_stale(entry.path)
+
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            for name in filenames:
+                if _DIGEST_RE.match(name) and name not in keep:
+                    remove_stale(os.path.join(dirpath, name))
+        return tuple(removed)
+
+
+def _touch(path):
+    """Mark an existing blob as just stored and return True, or False if there is none.
+
+    A blob stored again may be about to be referenced by a new recording, so
+    collect_garbage() must treat it as young even if nothing referenced it so far.
+    """
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _scandir(path):
+    try:
+        return list(os.scandir(path))
+    except FileNotFoundError:
+        return []
+
+
+def init_app(app, store=None):
+    app.config.setdefault('AUDIO_STORE_PATH', os.path.join(app.instance_path, 'audio'))
+    app.config.setdefault('AUDIO_MAX_BYTES', 50 * 1024 * 1024)
+    # Background normalisation (see audio_ingest.py)
+    app.config.setdefault('AUDIO_CANONICAL_FORMAT', 'opus')
+    app.config.setdefault('AUDIO_MIN_SECONDS', 1.0)
+    app.config.setdefault('AUDIO_MAX_SECONDS', 600.0)
+    app.config.setdefault('AUDIO_MIN_SAMPLE_RATE', 8000)
+    app.config.setdefault('AUDIO_KEEP_ORIGINAL', True)
+    if store is None:
+        store = FileSystemAudioStore(app.config['AUDIO_STORE_PATH'])
+    app.extensions['audio_store'] = store
+
+
+def get_store():
+    return current_app.extensions['audio_store']
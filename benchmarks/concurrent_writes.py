@@ -0,0 +1,94 @@
+"""Concurrent write benchmark for the SQLite engine profile.
+
+Posts recording forms from many threads at once, first with SQLite's
+defaults (rollback journal, deferred transactions) and then with the
+production profile from sqlite_profile.py, and reports throughput and
+"database is locked" failures for each. Fails if the production profile
+drops any write.
+
+    python benchmarks/concurrent_writes.py --writers 16 --requests 50
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test import create_app  # noqa: E402
+from models import db, Recording  # noqa: E402
+
+PROFILES = {
+    'default': {'SQLITE_DATABASE_PRAGMAS': {}, 'SQLITE_PRAGMAS': {}, 'SQLITE_IMMEDIATE_WRITES': False, 'SQLALCHEMY_ENGINE_OPTIONS': {}},
+    'production': {},
+}
+
+
+def run(profile, writers, requests, tmp):
+    app = create_app(dict(PROFILES[profile], **{
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, f'{profile}.db'),
+        'AUDIO_STORE_PATH': os.path.join(tmp, 'audio'),
+    }))
+    # Failed requests are counted below, not logged one by one
+    app.logger.disabled = True
+    logging.getLogger('werkzeug').disabled = True
+    with app.app_context():
+        db.create_all()
+
+    statuses = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(writers)
+
+    def writer(patient_id):
+        client = app.test_client()
+        barrier.wait()
+        for day in range(1, requests + 1):
+            response = client.post('/recording', data={
+                'patient_id': str(patient_id), 'recording_type': 'daily',
+                'hospitalization_day': str(day), 'weight': '72.5', 'pulse': '70',
+            })
+            with lock:
+                statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=writer, args=(i + 1,)) for i in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        stored = db.session.scalar(db.select(db.func.count(Recording.id)))
+        db.engine.dispose()
+    failed = sum(status >= 500 for status in statuses)
+    return {'profile': profile, 'seconds': elapsed, 'writes_per_second': stored / elapsed,
+            'stored': stored, 'failed': failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=50, help='recordings posted by each writer')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in PROFILES:
+            result = run(profile, args.writers, args.requests, tmp)
+            results.append(result)
+            print(f"{profile}: writers={args.writers} stored={result['stored']}/{args.writers * args.requests} "
+                  f"failed={result['failed']} {result['writes_per_second']:.0f} writes/s "
+                  f"({result['seconds']:.2f}s)")
+
+    default, production = results
+    print(f"speedup {production['writes_per_second'] / default['writes_per_second']:.2f}x")
+    if production['failed']:
+        sys.exit(f"production profile dropped {production['failed']} writes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Memory regression benchmark for the dashboards page.
+
+Seeds a throwaway database with recordings that each carry a voice sample,
+then renders /dashboards once in a fresh process, so the seeding does not set
+the peak. Fails if that process's peak RSS exceeds the budget; the request's
+own allocation peak (tracemalloc) is reported too.
+
+    python benchmarks/dashboard_memory.py --recordings 10000 --audio-kb 50 --budget-mb 256
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test import create_app  # noqa: E402
+from models import db  # noqa: E402
+from synthetic import seed  # noqa: E402
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _app(tmp):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+        'AUDIO_STORE_PATH': os.path.join(tmp, 'audio'),
+    })
+
+
+def worker(tmp):
+    """Run in a new process: render /dashboards once against the seeded database."""
+    app = _app(tmp)
+    before = peak_rss_mb()
+    tracemalloc.start()
+    response = app.test_client().get('/dashboards')
+    allocated = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+    return {'status': response.status_code, 'html_kb': len(response.data) / 1024,
+            'before': before, 'after': peak_rss_mb(), 'allocated': allocated}
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--worker':
+        print(json.dumps(worker(sys.argv[2])))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recordings', type=int, default=10000)
+    parser.add_argument('--per-patient', type=int, default=20)
+    parser.add_argument('--audio-kb', type=int, default=50)
+    parser.add_argument('--budget-mb', type=float, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = _app(tmp)
+        with app.app_context():
+            db.create_all()
+            seed(max(1, args.recordings // args.per_patient), args.per_patient, args.audio_kb)
+            db.session.remove()
+            db.engine.dispose()
+
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', tmp],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.splitlines()[-1])
+
+    print(f"recordings={args.recordings} audio={args.audio_kb}KB status={result['status']} "
+          f"html={result['html_kb']:.0f}KB peak_rss_before={result['before']:.1f}MB "
+          f"peak_rss_after={result['after']:.1f}MB request_alloc_peak={result['allocated']:.1f}MB")
+    if result['status'] != 200:
+        sys.exit('dashboards returned %d' % result['status'])
+    if result['after'] > args.budget_mb:
+        sys.exit(f"peak RSS {result['after']:.1f}MB exceeds budget {args.budget_mb:.0f}MB")
+
+
+if __name__ == '__main__':
+    main()
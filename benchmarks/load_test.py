@@ -0,0 +1,215 @@
+"""Latency and throughput benchmark for the main views.
+
+Seeds a throwaway database with a synthetic cohort (see synthetic.py), then
+sends a fixed, seeded sequence of requests to /dashboards, /search,
+/recording (GET and POST, with audio) and /delete_recording. Requests go
+through the Flask test client (one thread, no HTTP) and through a local
+threaded WSGI server (real HTTP, several client threads). Prints a JSON
+report of p50/p95/p99 latency, throughput and peak RSS per view.
+
+    python benchmarks/load_test.py --patients 200 --per-patient 10 --requests 200 --output baseline.json
+    python benchmarks/load_test.py --baseline baseline.json --tolerance 0.25
+"""
+import argparse
+import http.client
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server  # noqa: E402
+
+from test import create_app  # noqa: E402
+from models import db  # noqa: E402
+from dashboard_memory import peak_rss_mb  # noqa: E402
+from synthetic import seed  # noqa: E402
+
+SCENARIOS = ['dashboards', 'search', 'recording_get', 'recording_post', 'delete_recording']
+EXPECTED_STATUS = {'recording_post': 302, 'delete_recording': 302}
+
+
+def _requests(scenario, count, rng, patients, recordings, audio_kb):
+    """The seeded request sequence for one scenario as ``(method, path, form, files)`` tuples."""
+    if scenario == 'delete_recording':
+        return [('POST', f'/delete_recording/{recording_id}', None, None)
+                for recording_id in rng.sample(range(1, recordings + 1), min(count, recordings))]
+    specs = []
+    for _ in range(count):
+        patient_id = rng.randint(1, patients)
+        if scenario == 'dashboards':
+            specs.append(('GET', '/dashboards', None, None))
+        elif scenario == 'search':
+            specs.append(('GET', f'/search?query={patient_id}', None, None))
+        elif scenario == 'recording_get':
+            specs.append(('GET', f'/recording?patient_id={patient_id}', None, None))
+        else:
+            form = {'patient_id': str(patient_id), 'recording_type': 'daily',
+                    'hospitalization_day': str(rng.randint(2, 20)), 'weight': f'{rng.uniform(55, 110):.1f}',
+                    'pulse': str(rng.randint(55, 110))}
+            files = {'voice_sample': rng.randbytes(audio_kb * 1024)} if audio_kb else None
+            specs.append(('POST', '/recording', form, files))
+    return specs
+
+
+def _multipart(form, files):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in form.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, data in (files or {}).items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}.webm"\r\n'
+                   f'Content-Type: audio/webm\r\n\r\n'.encode())
+        body.write(data)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+def _drive_client(app, specs):
+    client = app.test_client()
+    timings = []
+    for method, path, form, files in specs:
+        data = dict(form or {})
+        for name, payload in (files or {}).items():
+            data[name] = (io.BytesIO(payload), f'{name}.webm', 'audio/webm')
+        start = time.perf_counter()
+        response = client.open(path, method=method, data=data or None)
+        timings.append((time.perf_counter() - start, response.status_code))
+    return timings
+
+
+def _drive_server(port, specs, concurrency):
+    def send(spec):
+        method, path, form, files = spec
+        body, headers = None, {}
+        if form is not None:
+            body, headers['Content-Type'] = _multipart(form, files)
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return time.perf_counter() - start, response.status
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(send, specs))
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def _summarise(scenario, timings, wall):
+    latencies = sorted(seconds * 1000 for seconds, _ in timings)
+    expected = EXPECTED_STATUS.get(scenario, 200)
+    return {
+        'requests': len(timings),
+        'errors': sum(status != expected for _, status in timings),
+        'p50_ms': round(_percentile(latencies, 0.50), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'p99_ms': round(_percentile(latencies, 0.99), 2),
+        'throughput_rps': round(len(timings) / wall, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def run(mode, args, tmp):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, f'{mode}.db'),
+        'AUDIO_STORE_PATH': os.path.join(tmp, f'{mode}-audio'),
+    })
+    app.logger.disabled = True
+    logging.getLogger('werkzeug').disabled = True
+    with app.app_context():
+        db.create_all()
+        recordings = seed(args.patients, args.per_patient, args.audio_kb, seed=args.seed)
+        db.session.remove()
+
+    server = None
+    if mode == 'server':
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    rng = random.Random(args.seed)
+    results = {}
+    try:
+        for scenario in SCENARIOS:
+            specs = _requests(scenario, args.requests, rng, args.patients, recordings, args.audio_kb)
+            start = time.perf_counter()
+            if server is None:
+                timings = _drive_client(app, specs)
+            else:
+                timings = _drive_server(server.port, specs, args.concurrency)
+            results[scenario] = _summarise(scenario, timings, time.perf_counter() - start)
+    finally:
+        if server is not None:
+            server.shutdown()
+        with app.app_context():
+            db.engine.dispose()
+    return results
+
+
+def _regressions(report, baseline, tolerance):
+    """p95 latencies that grew by more than ``tolerance`` (a fraction) over the baseline report."""
+    found = []
+    for mode, scenarios in report['results'].items():
+        for scenario, result in scenarios.items():
+            previous = baseline.get('results', {}).get(mode, {}).get(scenario)
+            if previous and result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                found.append(f"{mode}/{scenario}: p95 {result['p95_ms']}ms vs baseline {previous['p95_ms']}ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--per-patient', type=int, default=10)
+    parser.add_argument('--audio-kb', type=int, default=16, help='size of each seeded and uploaded clip')
+    parser.add_argument('--requests', type=int, default=200, help='requests per view')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads against the WSGI server')
+    parser.add_argument('--mode', choices=['client', 'server', 'both'], default='both')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='earlier JSON report; fail if any p95 regressed past --tolerance')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    modes = ['client', 'server'] if args.mode == 'both' else [args.mode]
+    report = {'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+              'results': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in modes:
+            report['results'][mode] = run(mode, args, tmp)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    errors = sum(result['errors'] for scenarios in report['results'].values() for result in scenarios.values())
+    if errors:
+        sys.exit(f'{errors} request(s) returned an unexpected status')
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = _regressions(report, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit('p95 regressions:\n' + '\n'.join(regressions))
+
+
+if __name__ == '__main__':
+    main()
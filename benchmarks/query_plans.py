@@ -0,0 +1,119 @@
+"""Query plan regression check for the per-patient views.
+
+Seeds a throwaway database, drives each view through the test client while
+recording every SQL statement it issues, then runs ``EXPLAIN QUERY PLAN`` on
+each statement and fails if any of them scans a table instead of using an
+index. A view that does not answer with its expected status fails as well:
+an error page does not run the queries whose plans are to be checked.
+
+    python benchmarks/query_plans.py --recordings 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+
+from test import create_app  # noqa: E402
+from audio_store import get_store  # noqa: E402
+from models import db, Recording, RecordingAudio  # noqa: E402
+from synthetic import seed  # noqa: E402
+
+
+def _views(patient_id, recording_id):
+    return [
+        ('search', 200, 'GET', f'/search?query={patient_id}'),
+        ('text_search', 200, 'GET', '/search?query=sacubitril'),
+        ('recording', 200, 'GET', f'/recording?patient_id={patient_id}'),
+        ('dashboards', 200, 'GET', '/dashboards'),
+        ('dashboard_patients', 200, 'GET', '/dashboards/patients?tab=incomplete'),
+        ('dashboard_patient_card', 200, 'GET', f'/dashboards/patients/{patient_id}?tab=complete'),
+        ('api_patients', 200, 'GET', '/api/patients'),
+        ('api_patient_recordings', 200, 'GET', f'/api/patients/{patient_id}/recordings'),
+        ('patient_trends', 200, 'GET', f'/patient/{patient_id}/trends'),
+        ('cohort_analytics', 200, 'GET', '/api/analytics'),
+        ('recording_audio', 200, 'GET', f'/recording/{recording_id}/audio'),
+        ('delete_recording', 302, 'POST', f'/delete_recording/{recording_id}'),
+    ]
+
+
+# Keyset pagination walks the patient rowid in order and stops after one page; the
+# cohort analytics sum the materialised per-patient summaries, one row per patient
+ALLOWED_SCANS = {'SCAN patient', 'SCAN patient_summary', 'SCAN patient_field_summary'}
+
+
+def _full_scans(plan):
+    """Plan rows that read a whole table. ``SCAN t USING [COVERING] INDEX`` walks an index and is fine,
+    and so does scanning a view or subquery, whose own plan rows are checked as well."""
+    return [detail for detail in plan
+            if detail.startswith('SCAN ') and ' USING ' not in detail and detail not in ALLOWED_SCANS
+            and detail.split()[1] in db.metadata.tables]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recordings', type=int, default=100000)
+    parser.add_argument('--per-patient', type=int, default=20)
+    parser.add_argument('-v', '--verbose', action='store_true', help='print every plan, not only failures')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+            'AUDIO_STORE_PATH': os.path.join(tmp, 'audio'),
+        })
+        with app.app_context():
+            db.create_all()
+            seed(args.recordings // args.per_patient, args.per_patient)
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+            patient_id = args.recordings // args.per_patient // 2
+            recording_id = db.session.scalar(
+                db.select(Recording.id).where(Recording.patient_id == patient_id).limit(1))
+            # Seeding audio for every recording would write a file each; one clip is enough for the audio view
+            digest, size = get_store().put(b'\0' * 1024)
+            db.session.add(RecordingAudio(recording_id=recording_id, kind='voice_sample', sha256=digest, size=size,
+                                          mime='audio/webm'))
+            db.session.commit()
+
+            statements = []
+
+            def record(conn, cursor, statement, parameters, context, executemany):
+                if statement.lstrip().upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')):
+                    statements.append((statement, parameters))
+
+            client = app.test_client()
+            failures = 0
+            for name, status, method, url in _views(patient_id, recording_id):
+                statements.clear()
+                event.listen(db.engine, 'before_cursor_execute', record)
+                try:
+                    response = client.open(url, method=method)
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', record)
+                print(f'{name}: {method} {url} -> {response.status_code}, {len(statements)} statements')
+                if response.status_code != status:
+                    sys.exit(f'{name} returned {response.status_code}, expected {status}')
+
+                for statement, parameters in statements:
+                    plan = [row[-1] for row in db.session.connection().exec_driver_sql(
+                        'EXPLAIN QUERY PLAN ' + statement, tuple(parameters))]
+                    scans = _full_scans(plan)
+                    failures += bool(scans)
+                    if scans or args.verbose:
+                        print('  ' + ' '.join(statement.split())[:160])
+                        for detail in plan:
+                            print(('  ! ' if detail in scans else '    ') + detail)
+            db.session.remove()
+
+    if failures:
+        sys.exit(f'{failures} statement(s) scan a full table at {args.recordings} recordings')
+    print(f'all plans use indexes at {args.recordings} recordings')
+
+
+if __name__ == '__main__':
+    main()
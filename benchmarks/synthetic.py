@@ -0,0 +1,134 @@
+"""Seeded synthetic cohort for the benchmarks.
+
+Each patient gets one stay: an admission recording, daily recordings and,
+for most patients, a discharge recording on the last day. Rows are written
+with Core inserts in batches; completeness and KCCQ scores are computed
+with models.derive_columns because Core inserts skip the ORM hooks, and the
+clinical values go to the observation table with models.split_observations.
+"""
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+from audio_store import get_store  # noqa: E402
+from completeness import KCCQ_FIELDS  # noqa: E402
+from models import db, derive_columns, split_observations, Observation, Patient, Recording, RecordingAudio  # noqa: E402
+
+START = datetime.datetime(2025, 1, 1, 9, 0)
+
+
+def _lab(rng, suffix=''):
+    return {
+        'ntprobnp' + suffix: round(rng.lognormvariate(8, 0.8)),
+        'kalium' + suffix: round(rng.uniform(3.4, 5.4), 1),
+        'natrium' + suffix: round(rng.uniform(131, 146)),
+        'kreatinin_gfr' + suffix: f'{rng.uniform(0.7, 2.5):.2f} / {rng.randint(20, 90)}',
+        'harnstoff' + suffix: round(rng.uniform(20, 120)),
+        'hb' + suffix: round(rng.uniform(9, 16), 1),
+    }
+
+
+def _kccq(rng):
+    return {field: rng.randint(1, 5) for field in KCCQ_FIELDS}
+
+
+def recording_row(rng, recording_type, patient_id, day, admitted, weight):
+    """One synthetic recording as a field mapping (without id, completeness or scores)."""
+    row = {
+        'patient_id': patient_id,
+        'recording_type': recording_type,
+        'hospitalization_day': day,
+        'weight': weight,
+        'date': admitted + datetime.timedelta(days=day - 1, minutes=rng.randint(0, 600)),
+    }
+    if recording_type == 'admission':
+        row.update(_lab(rng))
+        row.update(_kccq(rng))
+        row.update({
+            'age': rng.randint(45, 95), 'gender': rng.choice(['m', 'f', 'd']), 'height': rng.randint(150, 195),
+            'diagnosis': 'HFrEF, NYHA III', 'medication': 'Furosemid 40mg, Ramipril 5mg, Bisoprolol 2.5mg',
+            'comorbidities': 'Arterielle Hypertonie, Diabetes mellitus Typ 2',
+            'admission_date': admitted.date(), 'initial_weight': weight, 'initial_bp': '135/85',
+        })
+    elif recording_type == 'daily':
+        row.update(_lab(rng, '_daily'))
+        row.update({
+            'bp': f'{rng.randint(100, 150)}/{rng.randint(60, 95)}', 'pulse': rng.randint(55, 110),
+            'medication_changes': rng.choice(['', 'Furosemid reduziert', 'Spironolacton begonnen']),
+        })
+    else:
+        row.update(_lab(rng))
+        row.update(_kccq(rng))
+        row.update({
+            'current_weight': weight, 'discharge_medication': 'Torasemid 10mg, Sacubitril/Valsartan 49/51mg',
+            'abschluss_labor': 'unauffällig', 'discharge_date': (admitted + datetime.timedelta(days=day - 1)).date(),
+        })
+    return row
+
+
+def seed(patients, per_patient, audio_kb=0, discharged=0.8, seed=0, batch_size=500):
+    """Insert ``patients`` stays of ``per_patient`` recordings each. Returns the number of recordings.
+
+    Every recording gets a standardized-sentence clip of ``audio_kb`` KiB random
+    bytes; admission and discharge recordings also get a story-telling clip.
+    ``audio_kb=0`` seeds no audio at all.
+    """
+    store = get_store()
+    rng = random.Random(seed)
+    db.session.execute(db.insert(Patient), [{'id': i} for i in range(1, patients + 1)])
+
+    stays = []
+    for patient_id in range(1, patients + 1):
+        admitted = START + datetime.timedelta(hours=rng.randint(0, 24 * 365))
+        stays.append((patient_id, admitted, rng.uniform(55, 110), rng.random() < discharged))
+
+    rows, audios = [], []
+    recording_id = 0
+    # Interleave patients day by day, like a ward filling the table over time
+    for day in range(1, per_patient + 1):
+        for patient_id, admitted, weight, is_discharged in stays:
+            if day == 1:
+                recording_type = 'admission'
+            elif day == per_patient and is_discharged:
+                recording_type = 'discharge'
+            else:
+                recording_type = 'daily'
+            recording_id += 1
+            row = recording_row(rng, recording_type, patient_id, day, admitted, round(weight - 0.3 * day, 1))
+            row['id'] = recording_id
+            rows.append(row)
+
+            if audio_kb:
+                kinds = ['voice_sample'] if recording_type == 'daily' else ['voice_sample', 'story_telling']
+                for kind in kinds:
+                    digest, size = store.put(rng.randbytes(audio_kb * 1024))
+                    audios.append({'recording_id': recording_id, 'kind': kind, 'sha256': digest, 'size': size,
+                                   'mime': 'audio/webm', 'created_at': row['date']})
+
+            if len(rows) == batch_size:
+                _insert(rows, audios, bool(audio_kb))
+                rows, audios = [], []
+    if rows:
+        _insert(rows, audios, bool(audio_kb))
+    analytics.refresh_patients()
+    db.session.commit()
+    analytics.invalidate()
+    return recording_id
+
+
+def _insert(rows, audios, has_audio):
+    derive_columns(rows, [has_audio] * len(rows))
+    observations = [dict(observation, recording_id=row['id']) for row in rows for observation in split_observations(row)]
+    # Rows differ in which columns they set; group them so each executemany has one column set
+    by_columns = {}
+    for row in rows:
+        by_columns.setdefault(tuple(sorted(row)), []).append(row)
+    for group in by_columns.values():
+        db.session.execute(db.insert(Recording), group)
+    db.session.execute(db.insert(Observation), observations)
+    if audios:
+        db.session.execute(db.insert(RecordingAudio), audios)
@@ -0,0 +1,101 @@
+"""Worker warm-up and render time of the template-heavy pages.
+
+Seeds a throwaway database, then starts fresh worker processes that each time
+their first /recording and /dashboards requests (template compilation
+included) without a bytecode cache, with an empty one and with the one the
+previous worker filled. The last worker also times repeated /dashboards
+requests with and without the patient card cache. Prints a JSON report.
+
+    python benchmarks/template_render.py --patients 200 --per-patient 10 --requests 50
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test import create_app  # noqa: E402
+from models import db  # noqa: E402
+from synthetic import seed  # noqa: E402
+
+FIRST_REQUESTS = ['/recording?patient_id=1', '/dashboards']
+
+
+def _app(database, cache_dir):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + database,
+        'AUDIO_STORE_PATH': os.path.join(os.path.dirname(database), 'audio'),
+        'TEMPLATE_CACHE_DIR': cache_dir,
+    })
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _get(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    if response.status_code != 200:
+        sys.exit(f'{url} returned {response.status_code}')
+    return time.perf_counter() - start
+
+
+def worker(database, cache_dir, requests):
+    """Run in a new process: time the first requests, then (``requests`` > 0) steady /dashboards renders."""
+    start = time.perf_counter()
+    app = _app(database, cache_dir or None)
+    client = app.test_client()
+    result = {'create_app_ms': _ms(time.perf_counter() - start)}
+    result.update({f'first {url}_ms': _ms(_get(client, url)) for url in FIRST_REQUESTS})
+    for size in ([0, app.config['PATIENT_CARD_CACHE_SIZE']] if requests else []):
+        app.config['PATIENT_CARD_CACHE_SIZE'] = size
+        timings = [_get(client, '/dashboards') for _ in range(requests)]
+        result[f'dashboards_card_cache_{size}_p50_ms'] = _ms(statistics.median(timings))
+    return result
+
+
+def _run_worker(database, cache_dir, requests):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', database, cache_dir, str(requests)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == '--worker':
+        print(json.dumps(worker(sys.argv[2], sys.argv[3], int(sys.argv[4]))))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--per-patient', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.db')
+        app = _app(database, None)
+        with app.app_context():
+            db.create_all()
+            seed(args.patients, args.per_patient)
+            db.session.remove()
+            db.engine.dispose()
+
+        cache_dir = os.path.join(tmp, 'templates')
+        report = {
+            'no_bytecode_cache': _run_worker(database, '', 0),
+            'cold_bytecode_cache': _run_worker(database, cache_dir, 0),
+            'warm_bytecode_cache': _run_worker(database, cache_dir, args.requests),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Columnar research export of the cohort (``flask export-cohort``).
+
+Rows are streamed from the database in fixed-size batches and written as
+Parquet row groups or Arrow IPC record batches, so memory use does not grow
+with the cohort. Audio stays in the audio store; the export only references
+clips by digest in a separate ``recording_audio`` file.
+"""
+import datetime
+import json
+import os
+
+from completeness import KCCQ_FIELDS
+from models import OBSERVATION_KINDS, Recording, RecordingAudio, db, observation_column
+
+STATE_FILE = 'export_state.json'
+
+
+def _arrow_type(pa, column):
+    if column.name in KCCQ_FIELDS:
+        return pa.int8()
+    if isinstance(column.type, db.Boolean):
+        return pa.bool_()
+    if isinstance(column.type, db.Integer):
+        return pa.int64() if column.primary_key or column.name.endswith('_id') else pa.int32()
+    if isinstance(column.type, db.Float):
+        return pa.float64()
+    if isinstance(column.type, db.DateTime):
+        return pa.timestamp('us')
+    if isinstance(column.type, db.Date):
+        return pa.date32()
+    return pa.string()
+
+
+def _load_state(output_dir):
+    path = os.path.join(output_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+class _Writer:
+    def __init__(self, pa, fmt, path, schema):
+        self.pa = pa
+        self.schema = schema
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, schema, compression='zstd')
+            self._write = lambda batch: self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._sink = pa.OSFile(path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, schema)
+            self._write = self._writer.write_batch
+
+    def write(self, rows):
+        arrays = [self.pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(self.schema)]
+        self._write(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+        if hasattr(self, '_sink'):
+            self._sink.close()
+
+
+def _export_table(pa, fmt, path, columns, statement, batch_size):
+    """Stream ``statement`` into ``path``; returns ``(rows_written, last_row)``."""
+    schema = pa.schema([pa.field(column.name, _arrow_type(pa, column)) for column in columns])
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    writer = None
+    written = 0
+    last_row = None
+    try:
+        for rows in result.partitions():
+            if writer is None:
+                writer = _Writer(pa, fmt, path, schema)
+            writer.write(rows)
+            written += len(rows)
+            last_row = rows[-1]
+    finally:
+        if writer is not None:
+            writer.close()
+    return written, last_row
+
+
+def export_cohort(output_dir, fmt='parquet', batch_size=5000, incremental=False, include_audio=True):
+    """Write recordings (and audio references) newer than the watermark to ``output_dir``.
+
+    Returns a summary dict with the files written and row counts.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError('export-cohort needs pyarrow (pip install pyarrow)')
+
+    os.makedirs(output_dir, exist_ok=True)
+    state = _load_state(output_dir) if incremental else {}
+    watermark = state.get('recording_id', 0)
+    stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+    extension = 'parquet' if fmt == 'parquet' else 'arrow'
+
+    # One wide row per recording, the observations pivoted back into columns
+    recording_columns = list(Recording.__table__.columns) + [observation_column(code) for code in OBSERVATION_KINDS]
+    path = os.path.join(output_dir, f'recordings-{stamp}.{extension}')
+    rows, last_row = _export_table(
+        pa, fmt, path, recording_columns,
+        db.select(*recording_columns).where(Recording.id > watermark).order_by(Recording.id),
+        batch_size
+    )
+    summary = {'files': [path] if rows else [], 'recordings': rows, 'audio': 0}
+    if not rows:
+        return summary
+    new_watermark = last_row.id
+
+    if include_audio:
+        # Waveform peaks are a UI cache, not research data
+        audio_columns = [column for column in RecordingAudio.__table__.columns if not isinstance(column.type, db.JSON)]
+        audio_path = os.path.join(output_dir, f'recording_audio-{stamp}.{extension}')
+        summary['audio'], _ = _export_table(
+            pa, fmt, audio_path, audio_columns,
+            db.select(*audio_columns).where(
+                RecordingAudio.recording_id > watermark, RecordingAudio.recording_id <= new_watermark
+            ).order_by(RecordingAudio.id),
+            batch_size
+        )
+        if summary['audio']:
+            summary['files'].append(audio_path)
+
+    _save_state(output_dir, {'recording_id': new_watermark, 'exported_at': stamp})
+    return summary
@@ -0,0 +1,102 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('process-audio')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: one per CPU core).')
+@click.option('--batch-size', type=int, default=16, show_default=True, help='Jobs claimed per round.')
+@click.option('--poll-interval', type=float, default=2.0, show_default=True, help='Seconds to wait when the queue is empty.')
+@click.option('--once', is_flag=True, help='Exit as soon as no queued job is due.')
+@with_appcontext
+def process_audio_command(workers, batch_size, poll_interval, once):
+    """Normalise uploaded audio clips and extract their voice features."""
+    import audio_jobs
+
+    handled = audio_jobs.run_worker(workers=workers, batch_size=batch_size, poll_interval=poll_interval, once=once)
+    click.echo(f'Processed {handled} job(s).')
+
+
+@click.command('export-cohort')
+@click.argument('output_dir', type=click.Path(file_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['parquet', 'arrow']), default='parquet', show_default=True)
+@click.option('--batch-size', type=int, default=5000, show_default=True, help='Rows fetched and written per batch.')
+@click.option('--incremental', is_flag=True, help='Only export recordings newer than the last export to OUTPUT_DIR.')
+@click.option('--no-audio', is_flag=True, help='Skip the recording_audio reference file.')
+@with_appcontext
+def export_cohort_command(output_dir, fmt, batch_size, incremental, no_audio):
+    """Export recordings to Parquet or Arrow IPC files in OUTPUT_DIR."""
+    from cohort_export import export_cohort
+
+    try:
+        summary = export_cohort(output_dir, fmt=fmt, batch_size=batch_size,
+                                incremental=incremental, include_audio=not no_audio)
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f"Exported {summary['recordings']} recording(s) and {summary['audio']} audio reference(s).")
+    for path in summary['files']:
+        click.echo(f'  {path}')
+
+
+def _mib(size):
+    return f'{size / (1024 * 1024):.1f} MiB'
+
+
+@click.command('compact')
+@click.option('--full', is_flag=True, help='Rewrite the whole database with VACUUM (needed once for older databases).')
+@click.option('--step-pages', type=int, default=1024, show_default=True,
+              help='Pages freed per incremental vacuum transaction.')
+@click.option('--audio/--no-audio', default=True, show_default=True, help='Also delete unreferenced audio samples.')
+@click.option('--min-age-hours', type=float, default=24.0, show_default=True,
+              help='Keep audio files and uploads modified more recently than this.')
+@with_appcontext
+def compact_command(full, step_pages, audio, min_age_hours):
+    """Reclaim space freed by deleted recordings, in the database and the audio store."""
+    from audio_store import get_store
+    from compaction import compact_database, referenced_audio
+    from models import db
+
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('compact only supports SQLite databases.')
+    result = compact_database(db.engine, full=full, step_pages=step_pages)
+    if result['mode'] == 'needs-full':
+        click.echo('Database: not in incremental auto-vacuum mode; run once with --full to convert it.')
+    else:
+        click.echo(f"Database ({result['mode']}): {_mib(result['before'])} -> {_mib(result['after'])}, "
+                   f"{_mib(max(0, result['before'] - result['after']))} reclaimed.")
+
+    if audio:
+        files, size = get_store().collect_garbage(referenced_audio(), min_age=min_age_hours * 3600)
+        db.session.remove()
+        click.echo(f'Audio store: removed {files} file(s), {_mib(size)} reclaimed.')
+
+
+@click.command('refresh-analytics')
+@with_appcontext
+def refresh_analytics_command():
+    """Rebuild the per-patient analytics summaries, e.g. after writing to the database directly."""
+    import analytics
+    from models import PatientSummary, db
+
+    analytics.refresh_patients()
+    db.session.commit()
+    analytics.invalidate()
+    click.echo(f'Summarised {db.session.scalar(db.select(db.func.count()).select_from(PatientSummary))} patient(s).')
+
+
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates_command():
+    """Compile every template into the bytecode cache, so new workers do not have to."""
+    from flask import current_app
+    import template_cache
+
+    names = template_cache.compile_templates(current_app)
+    click.echo(f"Compiled {len(names)} template(s) into {current_app.config['TEMPLATE_CACHE_DIR']}.")
+
+
+def register_commands(app):
+    app.cli.add_command(process_audio_command)
+    app.cli.add_command(export_cohort_command)
+    app.cli.add_command(compact_command)
+    app.cli.add_command(refresh_analytics_command)
+    app.cli.add_command(compile_templates_command)
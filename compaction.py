@@ -0,0 +1,68 @@
+"""Give disk space back after deletes, for ``flask compact`` run from cron or a systemd timer.
+
+Deleting recordings frees pages inside the SQLite file but never shrinks it.
+With ``auto_vacuum=INCREMENTAL`` (set for new databases by sqlite_profile.py)
+the free pages are returned a step at a time, each step a short write
+transaction, so the app keeps serving while it runs. A database created before
+that needs one full ``VACUUM`` to switch modes; it rewrites the file in place
+and blocks writers (not readers, under WAL) while it runs.
+
+Samples in the audio store are shared by content hash, so they are collected
+separately: whatever no recording_audio row references, as the canonical
+rendition or as the original upload.
+"""
+import os
+
+from models import RecordingAudio, db
+
+INCREMENTAL = 2  # PRAGMA auto_vacuum value
+
+
+def database_size(path):
+    """Bytes on disk of the database file plus its write-ahead log."""
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def _pragma(connection, statement):
+    return connection.exec_driver_sql(f'PRAGMA {statement}').scalar()
+
+
+def compact_database(engine, full=False, step_pages=1024):
+    """Return free pages to the filesystem; returns ``{'before', 'after', 'mode'}`` sizes in bytes.
+
+    ``mode`` is ``'incremental'``, ``'full'``, or ``'needs-full'`` when the
+    database is not in incremental auto-vacuum mode and ``full`` was not given.
+    """
+    path = engine.url.database
+    before = database_size(path)
+    # VACUUM and the checkpoint cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if full:
+            mode = 'full'
+            connection.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+            connection.exec_driver_sql('VACUUM')
+        elif _pragma(connection, 'auto_vacuum') != INCREMENTAL:
+            mode = 'needs-full'
+        else:
+            mode = 'incremental'
+            # The sqlite3 module steps a pragma that returns no rows only once, which frees a
+            # single page; executescript() runs it to completion, as its own short transaction
+            driver_connection = connection.connection.driver_connection
+            while True:
+                free = _pragma(connection, 'freelist_count')
+                if not free:
+                    break
+                driver_connection.executescript(f'PRAGMA incremental_vacuum({int(step_pages)})')
+                if _pragma(connection, 'freelist_count') >= free:
+                    break
+        # The freed pages only leave the file once the WAL is checkpointed into it
+        connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)').all()
+    return {'before': before, 'after': database_size(path), 'mode': mode}
+
+
+def referenced_audio():
+    """Digests of every stored sample a recording_audio row still points at."""
+    digests = set(db.session.scalars(db.select(RecordingAudio.sha256)))
+    digests.update(db.session.scalars(
+        db.select(RecordingAudio.original_sha256).where(RecordingAudio.original_sha256.is_not(None))))
+    return digests
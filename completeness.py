@@ -0,0 +1,39 @@
+"""Which fields a recording needs before it counts as complete.
+
+"voice_sample" stands for the recording's standardized-sentence clip.
+"""
+
+KCCQ_FIELDS = [
+    "kccq1a", "kccq1b", "kccq1c", "kccq1d", "kccq1e", "kccq1f",
+    "kccq2", "kccq3", "kccq4", "kccq5", "kccq6", "kccq7", "kccq8", "kccq9", "kccq10", "kccq11",
+    "kccq12", "kccq13", "kccq14", "kccq15a", "kccq15b", "kccq15c", "kccq15d", "kccq16",
+]
+
+REQUIRED_FIELDS_BY_TYPE = {
+    "admission": [
+        "recording_type", "hospitalization_day", "age", "gender", "height", "diagnosis", "medication", "comorbidities",
+        "admission_date", "ntprobnp", "kalium", "natrium", "kreatinin_gfr", "harnstoff", "hb",
+        "initial_weight", "initial_bp", "voice_sample",
+    ] + KCCQ_FIELDS,
+    "daily": [
+        "recording_type", "hospitalization_day", "weight", "bp", "pulse", "voice_sample",
+        "medication_changes", "kalium_daily", "natrium_daily", "kreatinin_gfr_daily", "harnstoff_daily", "hb_daily", "ntprobnp_daily",
+    ],
+    "discharge": [
+        "recording_type", "hospitalization_day", "ntprobnp", "kalium", "natrium", "kreatinin_gfr", "harnstoff", "hb",
+        "current_weight", "discharge_medication", "discharge_date", "voice_sample",
+    ] + KCCQ_FIELDS,
+}
+
+DEFAULT_REQUIRED_FIELDS = ["recording_type", "hospitalization_day", "voice_sample"]
+
+ALL_REQUIRED_FIELDS = sorted(set(DEFAULT_REQUIRED_FIELDS).union(*REQUIRED_FIELDS_BY_TYPE.values()))
+
+
+def required_fields(recording_type):
+    return REQUIRED_FIELDS_BY_TYPE.get((recording_type or "").lower(), DEFAULT_REQUIRED_FIELDS)
+
+
+def missing_fields(recording_type, values):
+    """Return the required fields that are empty in ``values`` (a mapping of field name to value)."""
+    return [field for field in required_fields(recording_type) if values.get(field) in (None, '', 0)]
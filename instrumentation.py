@@ -0,0 +1,223 @@
+"""Opt-in per-request instrumentation for the views blueprint.
+
+Enabled with ``INSTRUMENTATION = True``. For every request to an instrumented
+blueprint it records wall time, SQL statement count and time, rows fetched,
+audio bytes served and template render time. Each response gets a
+``Server-Timing`` header and the totals are exported at ``/metrics`` in the
+Prometheus text format. Metrics live in process memory, so every worker
+process exports its own.
+
+With ``SLOW_REQUEST_SECONDS`` set, instrumented requests also run under
+cProfile and the profile of any request slower than the threshold is dumped
+to ``PROFILE_DIR`` for ``python -m pstats`` or snakeviz.
+"""
+import bisect
+import cProfile
+import datetime
+import os
+import threading
+import time
+
+from flask import Response, g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+
+# Request duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTERS = [
+    # (metric name, help text, per-request key)
+    ('app_sql_statements_total', 'SQL statements executed.', 'sql_count'),
+    ('app_sql_duration_seconds_total', 'Time spent executing SQL.', 'sql_time'),
+    ('app_sql_rows_fetched_total', 'Rows fetched from SQL results.', 'rows'),
+    ('app_audio_bytes_served_total', 'Audio bytes sent from the audio store.', 'audio_bytes'),
+    ('app_template_render_seconds_total', 'Time spent rendering templates.', 'template_time'),
+]
+
+
+class _CountingCursor:
+    """Wraps a DBAPI cursor and adds the number of fetched rows to the request's stats."""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats['rows'] += 1
+            yield row
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats['rows'] += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stats['rows'] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats['rows'] += len(rows)
+        return rows
+
+
+class Metrics:
+    """Process-wide request totals per endpoint, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._durations = {}
+        self._counters = {name: {} for name, _, _ in COUNTERS}
+
+    def observe(self, endpoint, method, status, stats):
+        with self._lock:
+            key = (endpoint, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            histogram = self._durations.setdefault(endpoint, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+            index = bisect.bisect_left(BUCKETS, stats['wall_time'])
+            if index < len(BUCKETS):
+                histogram['buckets'][index] += 1
+            histogram['sum'] += stats['wall_time']
+            histogram['count'] += 1
+            for name, _, stat in COUNTERS:
+                self._counters[name][endpoint] = self._counters[name].get(endpoint, 0) + stats[stat]
+
+    def render(self):
+        lines = ['# HELP app_requests_total Requests handled.', '# TYPE app_requests_total counter']
+        with self._lock:
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'app_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            lines += ['# HELP app_request_duration_seconds Request wall time.',
+                      '# TYPE app_request_duration_seconds histogram']
+            for endpoint, histogram in sorted(self._durations.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram['buckets']):
+                    cumulative += count
+                    lines.append(f'app_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'app_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'app_request_duration_seconds_sum{{endpoint="{endpoint}"}} {histogram["sum"]:.6f}')
+                lines.append(f'app_request_duration_seconds_count{{endpoint="{endpoint}"}} {histogram["count"]}')
+
+            for name, help_text, _ in COUNTERS:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for endpoint, value in sorted(self._counters[name].items()):
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _stats():
+    """The current request's stats, or None outside an instrumented request."""
+    if not has_request_context():
+        return None
+    return g.get('_instrumentation')
+
+
+def _server_timing(stats):
+    return ', '.join([
+        f'app;dur={stats["wall_time"] * 1000:.1f}',
+        f'sql;dur={stats["sql_time"] * 1000:.1f};desc="{stats["sql_count"]} statements, {stats["rows"]} rows"',
+        f'tpl;dur={stats["template_time"] * 1000:.1f}',
+    ])
+
+
+def init_app(app, db):
+    """Install the hooks when ``INSTRUMENTATION`` is on. Call after ``db.init_app(app)``."""
+    app.config.setdefault('INSTRUMENTATION', False)
+    app.config.setdefault('INSTRUMENTED_BLUEPRINTS', ('views',))
+    app.config.setdefault('SLOW_REQUEST_SECONDS', None)
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+    if not app.config['INSTRUMENTATION']:
+        return
+
+    blueprints = set(app.config['INSTRUMENTED_BLUEPRINTS'])
+    slow_seconds = app.config['SLOW_REQUEST_SECONDS']
+    metrics = app.extensions['instrumentation'] = Metrics()
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _stats() is not None:
+            conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _stats()
+        if stats is None or not conn.info.get('_query_start'):
+            return
+        stats['sql_count'] += 1
+        stats['sql_time'] += time.perf_counter() - conn.info['_query_start'].pop()
+        # The result object is built from context.cursor after this event, so its fetches are counted
+        if context is not None and not executemany and cursor.description is not None:
+            context.cursor = _CountingCursor(cursor, stats)
+
+    @before_render_template.connect_via(app)
+    def _before_render(sender, template, context, **extra):
+        stats = _stats()
+        if stats is not None:
+            stats['_template_start'] = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def _rendered(sender, template, context, **extra):
+        stats = _stats()
+        if stats is not None and '_template_start' in stats:
+            stats['template_time'] += time.perf_counter() - stats.pop('_template_start')
+
+    @app.before_request
+    def _start():
+        if request.blueprint not in blueprints:
+            return
+        g._instrumentation = {'start': time.perf_counter(), 'wall_time': 0.0, 'sql_count': 0, 'sql_time': 0.0,
+                              'rows': 0, 'audio_bytes': 0, 'template_time': 0.0, 'profile': None}
+        if slow_seconds is not None:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another request on this process is already being profiled
+                return
+            g._instrumentation['profile'] = profile
+
+    @app.after_request
+    def _finish(response):
+        stats = _stats()
+        if stats is None:
+            return response
+        profile = stats.pop('profile')
+        if profile is not None:
+            profile.disable()
+        stats['wall_time'] = time.perf_counter() - stats['start']
+        if response.mimetype.startswith('audio/') and response.content_length:
+            stats['audio_bytes'] = response.content_length
+
+        response.headers['Server-Timing'] = _server_timing(stats)
+        metrics.observe(request.endpoint, request.method, response.status_code, stats)
+
+        if profile is not None and stats['wall_time'] >= slow_seconds:
+            os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+            stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S.%f')
+            path = os.path.join(app.config['PROFILE_DIR'], f'{stamp}-{request.endpoint}.prof')
+            profile.dump_stats(path)
+            app.logger.warning('Slow request %s %s took %.0f ms (%d SQL statements, %.0f ms); profile written to %s',
+                               request.method, request.full_path, stats['wall_time'] * 1000, stats['sql_count'],
+                               stats['sql_time'] * 1000, path)
+        return response
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        # after_request does not run when the view raised; never leave a profiler on the thread
+        stats = _stats()
+        if stats is not None and stats.get('profile') is not None:
+            stats.pop('profile').disable()
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
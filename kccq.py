@@ -0,0 +1,164 @@
+"""KCCQ-23 domain and summary scores, vectorised over a whole cohort.
+
+Items are passed as a float array of shape (n, len(KCCQ_FIELDS)) in
+KCCQ_FIELDS order, with NaN for unanswered items. Answer codes are the ones
+the recording form offers (QUESTIONS). Scores are 0-100 (higher is better),
+NaN when too few items of a domain were answered.
+"""
+import numpy as np
+
+from completeness import KCCQ_FIELDS
+
+SCORE_FIELDS = [
+    "kccq_physical_limitation",
+    "kccq_symptom_stability",
+    "kccq_symptom_frequency",
+    "kccq_symptom_burden",
+    "kccq_total_symptom",
+    "kccq_self_efficacy",
+    "kccq_quality_of_life",
+    "kccq_social_limitation",
+    "kccq_clinical_summary",
+    "kccq_overall_summary",
+]
+
+_SEVERITY = [(1, "extrem"), (2, "sehr"), (3, "mäßig"), (4, "etwas"), (5, "überhaupt nicht")]
+_FREQUENCY = [(1, "ständig mehrmals am Tag"), (2, "mind. 1x/Tag"), (3, "3x/Woche oder öfter"), (4, "1-2x/Woche"),
+              (5, "weniger als 1x/Woche"), (6, "niemals")]
+
+# The questionnaire as recording.html shows it: (question, [(field, part)], answers) with
+# the answers as (code, text). Single-part questions have no part label.
+QUESTIONS = [
+    ("1. In welchem Ausmaß hat Herzinsuffizienz Ihre Fähigkeit, folgende Tätigkeiten auszuführen, beeinträchtigt?", [
+        ("kccq1a", "Sich selbst ankleiden"),
+        ("kccq1b", "Duschen / Baden"),
+        ("kccq1c", "100–200 m auf ebener Strecke gehen"),
+        ("kccq1d", "Garten-/Hausarbeit, Einkaufstaschen tragen"),
+        ("kccq1e", "Ohne Pause eine Treppe hochsteigen"),
+        ("kccq1f", "Laufen/Joggen (z.B. Bus erreichen)"),
+    ], _SEVERITY + [(9, "aus anderen Gründen beeinträchtigt/nicht ausgeführt")]),
+    ("2. Haben sich Ihre Beschwerden im Vergleich zu vor 2 Wochen geändert?", [("kccq2", None)], [
+        (1, "viel schlechter"), (2, "etwas schlechter"), (3, "unverändert"), (4, "etwas besser"), (5, "viel besser"),
+        (6, "keine Symptome")]),
+    ("3. Wie oft Schwellungen morgens beim Aufwachen?", [("kccq3", None)], [
+        (1, "jeden Morgen"), (2, "3x/Woche oder öfter"), (3, "1-2x/Woche"), (4, "weniger als 1x/Woche"),
+        (5, "niemals")]),
+    ("4. Wie beschwerlich waren die Schwellungen?", [("kccq4", None)], _SEVERITY + [(6, "keine Schwellungen")]),
+    ("5. Wie oft hat zu schnelle Ermüdung Sie abgehalten?", [("kccq5", None)], _FREQUENCY + [(7, "keine Ermüdung")]),
+    ("6. Wie beschwerlich war Ihre Ermüdung?", [("kccq6", None)], _SEVERITY + [(6, "keine Ermüdung")]),
+    ("7. Wie oft hat Atemnot Sie abgehalten?", [("kccq7", None)], _FREQUENCY + [(7, "keine Atemnot")]),
+    ("8. Wie beschwerlich war Ihre Atemnot?", [("kccq8", None)], _SEVERITY + [(6, "keine Atemnot")]),
+    ("9. Wie oft mussten Sie wegen Atemnot erhöht schlafen?", [("kccq9", None)], [
+        (1, "jede Nacht"), (2, "3x/Woche oder öfter"), (3, "1-2x/Woche"), (4, "weniger als 1x/Woche"),
+        (5, "niemals")]),
+    ("10. Wie sicher sind Sie, was zu tun ist, wenn sich Ihre Symptome verschlechtern?", [("kccq10", None)], [
+        (1, "überhaupt nicht sicher"), (2, "nicht sehr sicher"), (3, "teilweise sicher"), (4, "ziemlich sicher"),
+        (5, "vollkommen sicher")]),
+    ("11. Wie gut verstehen Sie, was Sie selbst tun können?", [("kccq11", None)], [
+        (1, "überhaupt nicht"), (2, "nicht sehr gut"), (3, "teilweise"), (4, "größtenteils"), (5, "vollkommen")]),
+    ("12. In welchem Ausmaß hat Ihre Herzinsuffizienz Ihre Lebensfreude beeinträchtigt?", [("kccq12", None)],
+     _SEVERITY),
+    ("13. Wie würden Sie sich fühlen, wenn Sie im jetzigen Zustand bleiben?", [("kccq13", None)], [
+        (1, "überhaupt nicht zufrieden"), (2, "größtenteils unzufrieden"), (3, "ziemlich zufrieden"),
+        (4, "größtenteils zufrieden"), (5, "vollkommen zufrieden")]),
+    ("14. Wie oft waren Sie entmutigt oder deprimiert?", [("kccq14", None)], [
+        (1, "ständig"), (2, "die meiste Zeit"), (3, "gelegentlich"), (4, "selten"), (5, "niemals")]),
+    ("15. In welchem Ausmaß beeinflusst Ihre Herzinsuffizienz Ihre Lebensweise?", [
+        ("kccq15a", "Hobbies/Freizeitaktivitäten"),
+        ("kccq15b", "Intime Beziehungen"),
+        ("kccq15c", "Besuche bei Familie/Freunden"),
+        ("kccq15d", "Arbeit/Hausarbeit"),
+    ], _SEVERITY + [(9, "nicht zutreffend")]),
+    ("16. Wie sehr haben Sie das Gefühl, Ihre Symptome beeinflussen zu können?", [("kccq16", None)], [
+        (1, "überhaupt nicht"), (2, "nicht sehr"), (3, "teilweise"), (4, "ziemlich"), (5, "vollkommen")]),
+]
+
+# Answer codes the form offers per item
+ANSWER_CODES = {field: [code for code, _ in answers] for _, parts, answers in QUESTIONS for field, _ in parts}
+
+_COLUMN = {field: i for i, field in enumerate(KCCQ_FIELDS)}
+
+
+def _items(items, *fields):
+    return items[:, [_COLUMN[field] for field in fields]]
+
+
+def _mean(values, minimum=1):
+    """Row-wise mean of the non-NaN values, NaN where fewer than ``minimum`` are present."""
+    answered = ~np.isnan(values)
+    count = answered.sum(axis=1)
+    total = np.where(answered, values, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    return np.where(count >= minimum, mean, np.nan)
+
+
+def _domain(rescaled, minimum):
+    """Domain score from items already rescaled to 0-1."""
+    return 100.0 * _mean(rescaled, minimum)
+
+
+def _mean_of(*scores):
+    return _mean(np.column_stack(scores))
+
+
+def score(items):
+    """Score an (n, 24) item matrix. Returns a dict of SCORE_FIELDS to arrays of length n."""
+    items = np.array(items, dtype=np.float64, ndmin=2)
+
+    # Q1: 9 = limited for other reasons / not done, counts as missing
+    physical = _items(items, "kccq1a", "kccq1b", "kccq1c", "kccq1d", "kccq1e", "kccq1f")
+    physical = np.where(physical == 9, np.nan, physical)
+
+    # Q2: 6 = no symptoms, scored as unchanged
+    stability = _items(items, "kccq2")
+    stability = np.where(stability == 6, 3, stability)
+
+    # Q3/Q9 have five answers. Q5/Q7 are asked on six steps here, 7 ("none") is scored like 6 ("never")
+    frequency = np.column_stack([
+        (items[:, _COLUMN["kccq3"]] - 1) / 4,
+        (np.minimum(items[:, _COLUMN["kccq5"]], 6) - 1) / 5,
+        (np.minimum(items[:, _COLUMN["kccq7"]], 6) - 1) / 5,
+        (items[:, _COLUMN["kccq9"]] - 1) / 4,
+    ])
+
+    # Q4/Q6/Q8: 6 = no such symptom, scored as not bothersome at all
+    burden = np.minimum(_items(items, "kccq4", "kccq6", "kccq8"), 5)
+
+    social = _items(items, "kccq15a", "kccq15b", "kccq15c", "kccq15d")
+    social = np.where(social == 9, np.nan, social)
+
+    scores = {
+        "kccq_physical_limitation": _domain((physical - 1) / 4, 3),
+        "kccq_symptom_stability": _domain((stability - 1) / 4, 1),
+        "kccq_symptom_frequency": _domain(frequency, 2),
+        "kccq_symptom_burden": _domain((burden - 1) / 4, 1),
+        "kccq_self_efficacy": _domain((_items(items, "kccq10", "kccq11") - 1) / 4, 1),
+        "kccq_quality_of_life": _domain((_items(items, "kccq12", "kccq13", "kccq14") - 1) / 4, 1),
+        "kccq_social_limitation": _domain((social - 1) / 4, 2),
+    }
+    scores["kccq_total_symptom"] = _mean_of(scores["kccq_symptom_frequency"], scores["kccq_symptom_burden"])
+    scores["kccq_clinical_summary"] = _mean_of(scores["kccq_physical_limitation"], scores["kccq_total_symptom"])
+    scores["kccq_overall_summary"] = _mean_of(
+        scores["kccq_physical_limitation"], scores["kccq_total_symptom"],
+        scores["kccq_quality_of_life"], scores["kccq_social_limitation"],
+    )
+    return scores
+
+
+def item_matrix(rows):
+    """Build the item matrix from mappings of KCCQ field name to answer (None or '' for missing)."""
+    return np.array([
+        [np.nan if row.get(field) in (None, '') else float(row.get(field)) for field in KCCQ_FIELDS]
+        for row in rows
+    ], dtype=np.float64).reshape(-1, len(KCCQ_FIELDS))
+
+
+def score_rows(rows):
+    """Score mappings of item answers; returns one dict of SCORE_FIELDS (None for NaN) per row."""
+    rows = list(rows)
+    scores = score(item_matrix(rows))
+    return [
+        {field: (None if np.isnan(scores[field][i]) else round(float(scores[field][i]), 2)) for field in SCORE_FIELDS}
+        for i in range(len(rows))
+    ]
@@ -97,6 +97,16 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        # SQLite batch migrations copy a table, drop the original and rename the
+        # copy. With foreign keys enforced (see sqlite_profile.py) that DROP would
+        # cascade into every referencing table, so migrations run without them.
+        # The pragma is ignored inside a transaction, hence the raw connection.
+        foreign_keys = None
+        if connection.dialect.name == 'sqlite':
+            driver_connection = connection.connection.driver_connection
+            foreign_keys, = driver_connection.execute('PRAGMA foreign_keys').fetchone()
+            driver_connection.execute('PRAGMA foreign_keys=OFF')
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -106,6 +116,9 @@ def run_migrations_online():
         with context.begin_transaction():
             context.run_migrations()
 
+        if foreign_keys:
+            driver_connection.execute('PRAGMA foreign_keys=ON')
+
 
 if context.is_offline_mode():
     run_migrations_offline()
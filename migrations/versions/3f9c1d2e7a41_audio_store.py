@@ -0,0 +1,67 @@
+"""move voice samples to audio store
+
+Revision ID: 3f9c1d2e7a41
+Revises: a87067c7e0d8
+Create Date: 2026-10-18 09:12:40.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from audio_store import get_store
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1d2e7a41'
+down_revision = 'a87067c7e0d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('voice_sample_sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('voice_sample_size', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('voice_sample_mime', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('voice_sample_duration', sa.Float(), nullable=True))
+
+    # Copy the blobs out one row at a time so the migration never holds more than one sample in memory
+    bind = op.get_bind()
+    store = get_store()
+    ids = [row[0] for row in bind.execute(sa.text(
+        "SELECT id FROM recording WHERE length(voice_sample) > 0"))]
+    for recording_id in ids:
+        blob = bind.execute(sa.text("SELECT voice_sample FROM recording WHERE id = :id"),
+                            {'id': recording_id}).scalar()
+        digest, size = store.put(bytes(blob))
+        bind.execute(sa.text(
+            "UPDATE recording SET voice_sample_sha256 = :digest, voice_sample_size = :size, "
+            "voice_sample_mime = 'audio/webm' WHERE id = :id"),
+            {'digest': digest, 'size': size, 'id': recording_id})
+
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.drop_column('voice_sample')
+
+    # Give the pages that held the blobs back to the filesystem
+    with op.get_context().autocommit_block():
+        op.execute('VACUUM')
+
+
+def downgrade():
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('voice_sample', sa.BLOB(), nullable=True))
+
+    bind = op.get_bind()
+    store = get_store()
+    rows = bind.execute(sa.text(
+        "SELECT id, voice_sample_sha256 FROM recording WHERE voice_sample_sha256 IS NOT NULL")).fetchall()
+    for recording_id, digest in rows:
+        with store.open(digest) as f:
+            bind.execute(sa.text("UPDATE recording SET voice_sample = :blob WHERE id = :id"),
+                         {'blob': f.read(), 'id': recording_id})
+
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.drop_column('voice_sample_duration')
+        batch_op.drop_column('voice_sample_mime')
+        batch_op.drop_column('voice_sample_size')
+        batch_op.drop_column('voice_sample_sha256')
@@ -0,0 +1,73 @@
+"""recording completeness
+
+Revision ID: 7b2e4c9d1f08
+Revises: 3f9c1d2e7a41
+Create Date: 2026-10-18 10:02:15.551370
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e4c9d1f08'
+down_revision = '3f9c1d2e7a41'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of completeness.py at this revision, when the voice sample was a recording column
+KCCQ_FIELDS = [
+    "kccq1a", "kccq1b", "kccq1c", "kccq1d", "kccq1e", "kccq1f",
+    "kccq2", "kccq3", "kccq4", "kccq5", "kccq6", "kccq7", "kccq8", "kccq9", "kccq10", "kccq11",
+    "kccq12", "kccq13", "kccq14", "kccq15a", "kccq15b", "kccq15c", "kccq15d", "kccq16",
+]
+REQUIRED_FIELDS_BY_TYPE = {
+    "admission": [
+        "recording_type", "hospitalization_day", "age", "gender", "height", "diagnosis", "medication", "comorbidities",
+        "admission_date", "ntprobnp", "kalium", "natrium", "kreatinin_gfr", "harnstoff", "hb",
+        "initial_weight", "initial_bp", "voice_sample_sha256",
+    ] + KCCQ_FIELDS,
+    "daily": [
+        "recording_type", "hospitalization_day", "weight", "bp", "pulse", "voice_sample_sha256",
+        "medication_changes", "kalium_daily", "natrium_daily", "kreatinin_gfr_daily", "harnstoff_daily", "hb_daily",
+        "ntprobnp_daily",
+    ],
+    "discharge": [
+        "recording_type", "hospitalization_day", "ntprobnp", "kalium", "natrium", "kreatinin_gfr", "harnstoff", "hb",
+        "current_weight", "discharge_medication", "discharge_date", "voice_sample_sha256",
+    ] + KCCQ_FIELDS,
+}
+DEFAULT_REQUIRED_FIELDS = ["recording_type", "hospitalization_day", "voice_sample_sha256"]
+ALL_REQUIRED_FIELDS = sorted(set(DEFAULT_REQUIRED_FIELDS).union(*REQUIRED_FIELDS_BY_TYPE.values()))
+
+
+def missing_fields(recording_type, values):
+    required = REQUIRED_FIELDS_BY_TYPE.get((recording_type or "").lower(), DEFAULT_REQUIRED_FIELDS)
+    return [field for field in required if values.get(field) in (None, '', 0)]
+
+
+def upgrade():
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_complete', sa.Boolean(), server_default=sa.false(), nullable=False))
+        batch_op.add_column(sa.Column('missing_fields_count', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_recording_is_complete_patient_id', ['is_complete', 'patient_id'], unique=False)
+
+    bind = op.get_bind()
+    columns = ['id'] + [field for field in ALL_REQUIRED_FIELDS if field != 'id']
+    rows = bind.execute(sa.text(f"SELECT {', '.join(columns)} FROM recording")).mappings()
+    updates = []
+    for row in rows:
+        missing = missing_fields(row['recording_type'], row)
+        updates.append({'id': row['id'], 'is_complete': not missing, 'missing_fields_count': len(missing)})
+    if updates:
+        bind.execute(sa.text(
+            "UPDATE recording SET is_complete = :is_complete, missing_fields_count = :missing_fields_count "
+            "WHERE id = :id"), updates)
+
+
+def downgrade():
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.drop_index('ix_recording_is_complete_patient_id')
+        batch_op.drop_column('missing_fields_count')
+        batch_op.drop_column('is_complete')
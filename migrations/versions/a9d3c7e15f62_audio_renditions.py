@@ -0,0 +1,49 @@
+"""canonical audio renditions and waveform peaks
+
+Revision ID: a9d3c7e15f62
+Revises: f5c19b3e8a27
+Create Date: 2026-10-18 15:12:40.937215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3c7e15f62'
+down_revision = 'f5c19b3e8a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recording_audio', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('original_sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('original_size', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('original_mime', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('sample_rate', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('channels', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('peaks', sa.JSON(), nullable=True))
+
+    # Normalise the clips stored so far on the next worker run
+    op.execute(
+        "INSERT INTO audio_job (audio_id, status, attempts, created_at) "
+        "SELECT id, 'queued', 0, CURRENT_TIMESTAMP FROM recording_audio WHERE NOT EXISTS ("
+        "SELECT 1 FROM audio_job WHERE audio_job.audio_id = recording_audio.id "
+        "AND audio_job.status IN ('queued', 'running'))"
+    )
+
+
+def downgrade():
+    # Point clips back at the bytes as uploaded; the renditions stay in the store unreferenced
+    op.execute(
+        "UPDATE recording_audio SET sha256 = original_sha256, size = original_size, mime = original_mime "
+        "WHERE original_sha256 IS NOT NULL"
+    )
+    with op.batch_alter_table('recording_audio', schema=None) as batch_op:
+        batch_op.drop_column('peaks')
+        batch_op.drop_column('channels')
+        batch_op.drop_column('sample_rate')
+        batch_op.drop_column('original_mime')
+        batch_op.drop_column('original_size')
+        batch_op.drop_column('original_sha256')
@@ -0,0 +1,26 @@
+"""retry delay for failed audio jobs
+
+Revision ID: b3e9d7a2c640
+Revises: f1a7d3c95e26
+Create Date: 2026-10-18 21:12:47.305118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e9d7a2c640'
+down_revision = 'f1a7d3c95e26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('audio_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('not_before', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('audio_job', schema=None) as batch_op:
+        batch_op.drop_column('not_before')
@@ -0,0 +1,28 @@
+"""client uuid for offline-captured recordings
+
+Revision ID: b7e41d9c2a53
+Revises: a9d3c7e15f62
+Create Date: 2026-10-18 16:04:21.518330
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e41d9c2a53'
+down_revision = 'a9d3c7e15f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('client_uuid', sa.String(length=36), nullable=True))
+        batch_op.create_index(batch_op.f('ix_recording_client_uuid'), ['client_uuid'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recording_client_uuid'))
+        batch_op.drop_column('client_uuid')
@@ -0,0 +1,49 @@
+"""long-format recording_observation view
+
+Revision ID: c2f8a6d41e97
+Revises: b7e41d9c2a53
+Create Date: 2026-10-18 16:47:09.204381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2f8a6d41e97'
+down_revision = 'b7e41d9c2a53'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of models.observation_view_sql() at this revision. Later batch migrations
+# that recreate the recording table must drop the view first and create it again after:
+# SQLite rejects the final rename while a view refers to the dropped table.
+VIEW_SQL = """
+    CREATE VIEW recording_observation AS
+    SELECT patient_id, id AS recording_id, recording_type, hospitalization_day, date, 'weight' AS metric, COALESCE(weight, current_weight, initial_weight) AS value FROM recording WHERE COALESCE(weight, current_weight, initial_weight) IS NOT NULL
+    UNION ALL
+    SELECT patient_id, id AS recording_id, recording_type, hospitalization_day, date, 'ntprobnp' AS metric, COALESCE(ntprobnp, ntprobnp_daily) AS value FROM recording WHERE COALESCE(ntprobnp, ntprobnp_daily) IS NOT NULL
+    UNION ALL
+    SELECT patient_id, id AS recording_id, recording_type, hospitalization_day, date, 'kalium' AS metric, COALESCE(kalium, kalium_daily) AS value FROM recording WHERE COALESCE(kalium, kalium_daily) IS NOT NULL
+    UNION ALL
+    SELECT patient_id, id AS recording_id, recording_type, hospitalization_day, date, 'natrium' AS metric, COALESCE(natrium, natrium_daily) AS value FROM recording WHERE COALESCE(natrium, natrium_daily) IS NOT NULL
+    UNION ALL
+    SELECT patient_id, id AS recording_id, recording_type, hospitalization_day, date, 'harnstoff' AS metric, COALESCE(harnstoff, harnstoff_daily) AS value FROM recording WHERE COALESCE(harnstoff, harnstoff_daily) IS NOT NULL
+    UNION ALL
+    SELECT patient_id, id AS recording_id, recording_type, hospitalization_day, date, 'hb' AS metric, COALESCE(hb, hb_daily) AS value FROM recording WHERE COALESCE(hb, hb_daily) IS NOT NULL
+    UNION ALL
+    SELECT patient_id, id AS recording_id, recording_type, hospitalization_day, date, 'pulse' AS metric, pulse AS value FROM recording WHERE pulse IS NOT NULL
+    UNION ALL
+    SELECT patient_id, id AS recording_id, recording_type, hospitalization_day, date, 'kccq_clinical_summary' AS metric, kccq_clinical_summary AS value FROM recording WHERE kccq_clinical_summary IS NOT NULL
+    UNION ALL
+    SELECT patient_id, id AS recording_id, recording_type, hospitalization_day, date, 'kccq_overall_summary' AS metric, kccq_overall_summary AS value FROM recording WHERE kccq_overall_summary IS NOT NULL
+"""
+
+
+def upgrade():
+    op.execute(VIEW_SQL)
+
+
+def downgrade():
+    op.execute('DROP VIEW IF EXISTS recording_observation')
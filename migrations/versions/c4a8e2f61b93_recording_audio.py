@@ -0,0 +1,62 @@
+"""recording audio clips
+
+Revision ID: c4a8e2f61b93
+Revises: 7b2e4c9d1f08
+Create Date: 2026-10-18 11:20:47.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e2f61b93'
+down_revision = '7b2e4c9d1f08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recording_audio',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('recording_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('mime', sa.String(length=100), nullable=True),
+    sa.Column('duration', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['recording_id'], ['recording.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('recording_id', 'kind', name='uq_recording_audio_recording_id_kind')
+    )
+
+    op.execute(
+        "INSERT INTO recording_audio (recording_id, kind, sha256, size, mime, duration, created_at) "
+        "SELECT id, 'voice_sample', voice_sample_sha256, voice_sample_size, voice_sample_mime, "
+        "voice_sample_duration, date FROM recording WHERE voice_sample_sha256 IS NOT NULL"
+    )
+
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.drop_column('voice_sample_duration')
+        batch_op.drop_column('voice_sample_mime')
+        batch_op.drop_column('voice_sample_size')
+        batch_op.drop_column('voice_sample_sha256')
+
+
+def downgrade():
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('voice_sample_sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('voice_sample_size', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('voice_sample_mime', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('voice_sample_duration', sa.Float(), nullable=True))
+
+    # Only the standardized sentence had a column of its own, other clips are dropped
+    op.execute(
+        "UPDATE recording SET "
+        "voice_sample_sha256 = (SELECT sha256 FROM recording_audio a WHERE a.recording_id = recording.id AND a.kind = 'voice_sample'), "
+        "voice_sample_size = (SELECT size FROM recording_audio a WHERE a.recording_id = recording.id AND a.kind = 'voice_sample'), "
+        "voice_sample_mime = (SELECT mime FROM recording_audio a WHERE a.recording_id = recording.id AND a.kind = 'voice_sample'), "
+        "voice_sample_duration = (SELECT duration FROM recording_audio a WHERE a.recording_id = recording.id AND a.kind = 'voice_sample')"
+    )
+    op.drop_table('recording_audio')
@@ -0,0 +1,149 @@
+"""move the clinical fields of recording into an observation table
+
+Revision ID: d4b9e2a70c18
+Revises: c2f8a6d41e97
+Create Date: 2026-10-18 17:32:51.640217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b9e2a70c18'
+down_revision = 'c2f8a6d41e97'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of the recording columns that become observation codes
+FIELDS = [
+    ('age', sa.Integer()),
+    ('gender', sa.String(length=10)),
+    ('height', sa.Float()),
+    ('diagnosis', sa.String(length=500)),
+    ('medication', sa.String(length=2000)),
+    ('comorbidities', sa.String(length=1000)),
+    ('admission_date', sa.Date()),
+    ('ntprobnp', sa.Float()),
+    ('kalium', sa.Float()),
+    ('natrium', sa.Float()),
+    ('kreatinin_gfr', sa.String(length=100)),
+    ('harnstoff', sa.Float()),
+    ('hb', sa.Float()),
+    ('initial_weight', sa.Float()),
+    ('initial_bp', sa.String(length=50)),
+    *[(f'kccq{item}', sa.Integer()) for item in (
+        '1a', '1b', '1c', '1d', '1e', '1f', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14',
+        '15a', '15b', '15c', '15d', '16')],
+    ('weight', sa.Float()),
+    ('bp', sa.String(length=50)),
+    ('pulse', sa.Integer()),
+    ('medication_changes', sa.String(length=2000)),
+    ('kalium_daily', sa.Float()),
+    ('natrium_daily', sa.Float()),
+    ('kreatinin_gfr_daily', sa.String(length=100)),
+    ('harnstoff_daily', sa.Float()),
+    ('hb_daily', sa.Float()),
+    ('ntprobnp_daily', sa.Float()),
+    ('abschluss_labor', sa.String(length=2000)),
+    ('current_weight', sa.Float()),
+    ('discharge_medication', sa.String(length=2000)),
+    ('discharge_date', sa.Date()),
+]
+
+# Frozen copy of models.OBSERVATION_METRICS at this revision
+METRICS = [
+    ('weight', ('weight', 'current_weight', 'initial_weight')),
+    ('ntprobnp', ('ntprobnp', 'ntprobnp_daily')),
+    ('kalium', ('kalium', 'kalium_daily')),
+    ('natrium', ('natrium', 'natrium_daily')),
+    ('harnstoff', ('harnstoff', 'harnstoff_daily')),
+    ('hb', ('hb', 'hb_daily')),
+    ('pulse', ('pulse',)),
+    ('kccq_clinical_summary', ('kccq_clinical_summary',)),
+    ('kccq_overall_summary', ('kccq_overall_summary',)),
+]
+CODES = {name for name, _ in FIELDS}
+
+
+def _column_view_sql():
+    """The view as created by c2f8a6d41e97, over the recording columns."""
+    parts = []
+    for metric, columns in METRICS:
+        value = f'COALESCE({", ".join(columns)})' if len(columns) > 1 else columns[0]
+        parts.append(
+            f"SELECT patient_id, id AS recording_id, recording_type, hospitalization_day, date, "
+            f"'{metric}' AS metric, {value} AS value FROM recording WHERE {value} IS NOT NULL"
+        )
+    return 'CREATE VIEW recording_observation AS\n' + '\nUNION ALL\n'.join(parts)
+
+
+def _observation_view_sql():
+    """The view over the observation table, as models.observation_view_sql() builds it."""
+    parts = []
+    for metric, sources in METRICS:
+        joins, values = [], []
+        # One source needs the row, so it is an inner join; CROSS JOIN keeps recording as the
+        # outer loop, where SQLite would otherwise scan that code across the whole cohort
+        join = 'CROSS JOIN' if len(sources) == 1 else 'LEFT JOIN'
+        for position, source in enumerate(sources):
+            if source in CODES:
+                alias = f'o{position}'
+                joins.append(f"{join} observation {alias} ON {alias}.recording_id = r.id AND {alias}.code = '{source}'")
+                values.append(f'{alias}.value')
+            else:
+                values.append(f'r.{source}')
+        value = f'COALESCE({", ".join(values)})' if len(values) > 1 else values[0]
+        parts.append(
+            f"SELECT r.patient_id, r.id AS recording_id, r.recording_type, r.hospitalization_day, r.date, "
+            f"'{metric}' AS metric, {value} AS value FROM recording r {' '.join(joins)} WHERE {value} IS NOT NULL"
+        )
+    return 'CREATE VIEW recording_observation AS\n' + '\nUNION ALL\n'.join(parts)
+
+
+def upgrade():
+    # SQLite rejects the batch rename of recording while the view refers to it
+    op.execute('DROP VIEW IF EXISTS recording_observation')
+
+    # BLOB declares no type affinity, so each value keeps its own storage class
+    op.create_table('observation',
+    sa.Column('recording_id', sa.Integer(), nullable=False),
+    sa.Column('code', sa.String(length=40), nullable=False),
+    sa.Column('value', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['recording_id'], ['recording.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('recording_id', 'code'),
+    sqlite_with_rowid=False
+    )
+    op.create_index('ix_observation_code_recording_id', 'observation', ['code', 'recording_id'], unique=False)
+
+    for name, _ in FIELDS:
+        op.execute(
+            f"INSERT INTO observation (recording_id, code, value) "
+            f"SELECT id, '{name}', {name} FROM recording WHERE {name} IS NOT NULL AND {name} != ''"
+        )
+
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        for name, _ in FIELDS:
+            batch_op.drop_column(name)
+
+    op.execute(_observation_view_sql())
+
+
+def downgrade():
+    op.execute('DROP VIEW IF EXISTS recording_observation')
+
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        for name, type_ in FIELDS:
+            batch_op.add_column(sa.Column(name, type_, nullable=True))
+
+    for name, _ in FIELDS:
+        op.execute(
+            f"UPDATE recording SET {name} = (SELECT value FROM observation "
+            f"WHERE observation.recording_id = recording.id AND observation.code = '{name}')"
+        )
+
+    op.drop_index('ix_observation_code_recording_id', table_name='observation')
+    op.drop_table('observation')
+
+    op.execute(_column_view_sql())
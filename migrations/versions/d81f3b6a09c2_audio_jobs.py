@@ -0,0 +1,64 @@
+"""audio jobs and voice features
+
+Revision ID: d81f3b6a09c2
+Revises: c4a8e2f61b93
+Create Date: 2026-10-18 12:41:03.176524
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3b6a09c2'
+down_revision = 'c4a8e2f61b93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('audio_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('audio_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['audio_id'], ['recording_audio.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('audio_job', schema=None) as batch_op:
+        batch_op.create_index('ix_audio_job_status_id', ['status', 'id'], unique=False)
+
+    op.create_table('voice_features',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('audio_id', sa.Integer(), nullable=False),
+    sa.Column('duration', sa.Float(), nullable=True),
+    sa.Column('rms_energy', sa.Float(), nullable=True),
+    sa.Column('f0_mean', sa.Float(), nullable=True),
+    sa.Column('f0_std', sa.Float(), nullable=True),
+    sa.Column('jitter', sa.Float(), nullable=True),
+    sa.Column('shimmer', sa.Float(), nullable=True),
+    sa.Column('pause_ratio', sa.Float(), nullable=True),
+    sa.Column('mfcc_means', sa.JSON(), nullable=True),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['audio_id'], ['recording_audio.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('audio_id')
+    )
+
+    # Queue the clips that were uploaded before the worker existed
+    op.execute(
+        "INSERT INTO audio_job (audio_id, status, attempts, created_at) "
+        "SELECT id, 'queued', 0, CURRENT_TIMESTAMP FROM recording_audio"
+    )
+
+
+def downgrade():
+    op.drop_table('voice_features')
+    with op.batch_alter_table('audio_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_audio_job_status_id')
+
+    op.drop_table('audio_job')
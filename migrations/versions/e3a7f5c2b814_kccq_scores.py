@@ -0,0 +1,124 @@
+"""kccq domain and summary scores
+
+Revision ID: e3a7f5c2b814
+Revises: d81f3b6a09c2
+Create Date: 2026-10-18 13:41:07.218904
+
+"""
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a7f5c2b814'
+down_revision = 'd81f3b6a09c2'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of completeness.KCCQ_FIELDS and of the kccq.py scoring at this revision
+KCCQ_FIELDS = [
+    "kccq1a", "kccq1b", "kccq1c", "kccq1d", "kccq1e", "kccq1f",
+    "kccq2", "kccq3", "kccq4", "kccq5", "kccq6", "kccq7", "kccq8", "kccq9", "kccq10", "kccq11",
+    "kccq12", "kccq13", "kccq14", "kccq15a", "kccq15b", "kccq15c", "kccq15d", "kccq16",
+]
+SCORE_FIELDS = [
+    "kccq_physical_limitation",
+    "kccq_symptom_stability",
+    "kccq_symptom_frequency",
+    "kccq_symptom_burden",
+    "kccq_total_symptom",
+    "kccq_self_efficacy",
+    "kccq_quality_of_life",
+    "kccq_social_limitation",
+    "kccq_clinical_summary",
+    "kccq_overall_summary",
+]
+_COLUMN = {field: i for i, field in enumerate(KCCQ_FIELDS)}
+
+
+def _items(items, *fields):
+    return items[:, [_COLUMN[field] for field in fields]]
+
+
+def _mean(values, minimum=1):
+    answered = ~np.isnan(values)
+    count = answered.sum(axis=1)
+    total = np.where(answered, values, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    return np.where(count >= minimum, mean, np.nan)
+
+
+def _domain(rescaled, minimum):
+    return 100.0 * _mean(rescaled, minimum)
+
+
+def _mean_of(*scores):
+    return _mean(np.column_stack(scores))
+
+
+def _score(items):
+    physical = _items(items, "kccq1a", "kccq1b", "kccq1c", "kccq1d", "kccq1e", "kccq1f")
+    physical = np.where(physical == 9, np.nan, physical)
+    stability = _items(items, "kccq2")
+    stability = np.where(stability == 6, 3, stability)
+    frequency = np.column_stack([
+        (items[:, _COLUMN["kccq3"]] - 1) / 4,
+        (np.minimum(items[:, _COLUMN["kccq5"]], 6) - 1) / 5,
+        (np.minimum(items[:, _COLUMN["kccq7"]], 6) - 1) / 5,
+        (items[:, _COLUMN["kccq9"]] - 1) / 4,
+    ])
+    burden = np.minimum(_items(items, "kccq4", "kccq6", "kccq8"), 5)
+    social = _items(items, "kccq15a", "kccq15b", "kccq15c", "kccq15d")
+    social = np.where(social == 9, np.nan, social)
+
+    scores = {
+        "kccq_physical_limitation": _domain((physical - 1) / 4, 3),
+        "kccq_symptom_stability": _domain((stability - 1) / 4, 1),
+        "kccq_symptom_frequency": _domain(frequency, 2),
+        "kccq_symptom_burden": _domain((burden - 1) / 4, 1),
+        "kccq_self_efficacy": _domain((_items(items, "kccq10", "kccq11") - 1) / 4, 1),
+        "kccq_quality_of_life": _domain((_items(items, "kccq12", "kccq13", "kccq14") - 1) / 4, 1),
+        "kccq_social_limitation": _domain((social - 1) / 4, 2),
+    }
+    scores["kccq_total_symptom"] = _mean_of(scores["kccq_symptom_frequency"], scores["kccq_symptom_burden"])
+    scores["kccq_clinical_summary"] = _mean_of(scores["kccq_physical_limitation"], scores["kccq_total_symptom"])
+    scores["kccq_overall_summary"] = _mean_of(
+        scores["kccq_physical_limitation"], scores["kccq_total_symptom"],
+        scores["kccq_quality_of_life"], scores["kccq_social_limitation"],
+    )
+    return scores
+
+
+def score_rows(rows):
+    items = np.array([
+        [np.nan if row.get(field) in (None, '') else float(row.get(field)) for field in KCCQ_FIELDS]
+        for row in rows
+    ], dtype=np.float64).reshape(-1, len(KCCQ_FIELDS))
+    scores = _score(items)
+    return [
+        {field: (None if np.isnan(scores[field][i]) else round(float(scores[field][i]), 2)) for field in SCORE_FIELDS}
+        for i in range(len(rows))
+    ]
+
+
+def upgrade():
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        for field in SCORE_FIELDS:
+            batch_op.add_column(sa.Column(field, sa.Float(), nullable=True))
+
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(f"SELECT id, {', '.join(KCCQ_FIELDS)} FROM recording")).mappings().all()
+    # Score the whole table in one vectorised pass
+    updates = [dict(scores, id=row['id']) for row, scores in zip(rows, score_rows(rows))]
+    if updates:
+        assignments = ', '.join(f'{field} = :{field}' for field in SCORE_FIELDS)
+        bind.execute(sa.text(f"UPDATE recording SET {assignments} WHERE id = :id"), updates)
+
+
+def downgrade():
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        for field in reversed(SCORE_FIELDS):
+            batch_op.drop_column(field)
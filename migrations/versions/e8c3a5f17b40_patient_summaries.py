@@ -0,0 +1,114 @@
+"""per-patient summaries for the cohort analytics
+
+Revision ID: e8c3a5f17b40
+Revises: d4b9e2a70c18
+Create Date: 2026-10-18 18:14:27.093518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c3a5f17b40'
+down_revision = 'd4b9e2a70c18'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of the (recording_type, field) pairs of analytics.REQUIRED_PAIRS at this revision
+KCCQ_FIELDS = [
+    'kccq1a', 'kccq1b', 'kccq1c', 'kccq1d', 'kccq1e', 'kccq1f',
+    'kccq2', 'kccq3', 'kccq4', 'kccq5', 'kccq6', 'kccq7', 'kccq8', 'kccq9', 'kccq10', 'kccq11',
+    'kccq12', 'kccq13', 'kccq14', 'kccq15a', 'kccq15b', 'kccq15c', 'kccq15d', 'kccq16',
+]
+REQUIRED_FIELDS_BY_TYPE = {
+    'admission': [
+        'hospitalization_day', 'age', 'gender', 'height', 'diagnosis', 'medication', 'comorbidities',
+        'admission_date', 'ntprobnp', 'kalium', 'natrium', 'kreatinin_gfr', 'harnstoff', 'hb',
+        'initial_weight', 'initial_bp', 'voice_sample',
+    ] + KCCQ_FIELDS,
+    'daily': [
+        'hospitalization_day', 'weight', 'bp', 'pulse', 'voice_sample',
+        'medication_changes', 'kalium_daily', 'natrium_daily', 'kreatinin_gfr_daily', 'harnstoff_daily', 'hb_daily',
+        'ntprobnp_daily',
+    ],
+    'discharge': [
+        'hospitalization_day', 'ntprobnp', 'kalium', 'natrium', 'kreatinin_gfr', 'harnstoff', 'hb',
+        'current_weight', 'discharge_medication', 'discharge_date', 'voice_sample',
+    ] + KCCQ_FIELDS,
+}
+REQUIRED_PAIRS = [
+    (recording_type, field) for recording_type, fields in REQUIRED_FIELDS_BY_TYPE.items() for field in fields
+]
+
+# Same rows as analytics.refresh_patients() writes, for the recordings stored so far
+SUMMARY_SQL = """
+    INSERT INTO patient_summary (
+        patient_id, recordings, complete_recordings, admission_recordings, daily_recordings, discharge_recordings,
+        admission_date, discharge_date, stay_days, kccq_admission, kccq_discharge)
+    SELECT r.patient_id, count(*), count(*) FILTER (WHERE r.is_complete),
+        count(*) FILTER (WHERE r.recording_type = 'admission'),
+        count(*) FILTER (WHERE r.recording_type = 'daily'),
+        count(*) FILTER (WHERE r.recording_type = 'discharge'),
+        min(a.value), max(d.value), CAST(julianday(max(d.value)) - julianday(min(a.value)) AS INTEGER),
+        (SELECT k.kccq_overall_summary FROM recording k
+         WHERE k.patient_id = r.patient_id AND k.recording_type = 'admission' AND k.kccq_overall_summary IS NOT NULL
+         ORDER BY k.date, k.id LIMIT 1),
+        (SELECT k.kccq_overall_summary FROM recording k
+         WHERE k.patient_id = r.patient_id AND k.recording_type = 'discharge' AND k.kccq_overall_summary IS NOT NULL
+         ORDER BY k.date DESC, k.id DESC LIMIT 1)
+    FROM recording r
+    LEFT JOIN observation a ON a.recording_id = r.id AND a.code = 'admission_date'
+    LEFT JOIN observation d ON d.recording_id = r.id AND d.code = 'discharge_date'
+    GROUP BY r.patient_id
+"""
+
+FIELD_SUMMARY_SQL = """
+    WITH required_field (recording_type, field) AS (VALUES {pairs})
+    INSERT INTO patient_field_summary (patient_id, recording_type, field, missing)
+    SELECT r.patient_id, r.recording_type, f.field, count(*) FILTER (WHERE NOT (
+        EXISTS (SELECT 1 FROM observation o
+                WHERE o.recording_id = r.id AND o.code = f.field AND o.value NOT IN ('', 0))
+        OR EXISTS (SELECT 1 FROM recording_audio a WHERE a.recording_id = r.id AND a.kind = f.field)
+        OR (f.field = 'hospitalization_day' AND coalesce(r.hospitalization_day, 0) != 0))) AS missing
+    FROM recording r JOIN required_field f ON f.recording_type = r.recording_type
+    GROUP BY r.patient_id, r.recording_type, f.field
+    HAVING missing > 0
+"""
+
+
+def upgrade():
+    op.create_table('patient_summary',
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('recordings', sa.Integer(), nullable=False),
+    sa.Column('complete_recordings', sa.Integer(), nullable=False),
+    sa.Column('admission_recordings', sa.Integer(), nullable=False),
+    sa.Column('daily_recordings', sa.Integer(), nullable=False),
+    sa.Column('discharge_recordings', sa.Integer(), nullable=False),
+    sa.Column('admission_date', sa.Date(), nullable=True),
+    sa.Column('discharge_date', sa.Date(), nullable=True),
+    sa.Column('stay_days', sa.Integer(), nullable=True),
+    sa.Column('kccq_admission', sa.Float(), nullable=True),
+    sa.Column('kccq_discharge', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['patient_id'], ['patient.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('patient_id')
+    )
+    op.create_table('patient_field_summary',
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('recording_type', sa.String(length=100), nullable=False),
+    sa.Column('field', sa.String(length=40), nullable=False),
+    sa.Column('missing', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['patient_id'], ['patient.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('patient_id', 'recording_type', 'field'),
+    sqlite_with_rowid=False
+    )
+
+    op.execute(SUMMARY_SQL)
+    pairs = ', '.join(f"('{recording_type}', '{field}')" for recording_type, field in REQUIRED_PAIRS)
+    op.execute(FIELD_SUMMARY_SQL.format(pairs=pairs))
+
+
+def downgrade():
+    op.drop_table('patient_field_summary')
+    op.drop_table('patient_summary')
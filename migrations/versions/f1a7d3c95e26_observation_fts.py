@@ -0,0 +1,55 @@
+"""full-text index over the free-text observations
+
+Revision ID: f1a7d3c95e26
+Revises: e8c3a5f17b40
+Create Date: 2026-10-18 18:51:06.318842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a7d3c95e26'
+down_revision = 'e8c3a5f17b40'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of models.TEXT_SEARCH_FIELDS at this revision; the position is part of the index rowid
+FIELDS = ('diagnosis', 'medication', 'comorbidities', 'medication_changes', 'discharge_medication', 'abschluss_labor')
+CODES = ', '.join(f"'{field}'" for field in FIELDS)
+
+
+def _rowid(row):
+    positions = ' '.join(f"WHEN '{field}' THEN {position}" for position, field in enumerate(FIELDS, 1))
+    return f'{row}.recording_id * 8 + CASE {row}.code {positions} END'
+
+
+# As models.text_search_ddl() builds them. Batch migrations that recreate the
+# observation table drop these triggers and must create them again.
+INSERT = (f"INSERT INTO observation_fts (rowid, value, code, recording_id) "
+          f"SELECT {_rowid('new')}, new.value, new.code, new.recording_id WHERE new.code IN ({CODES});")
+DELETE = f"DELETE FROM observation_fts WHERE rowid = {_rowid('old')};"
+DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS observation_fts USING fts5("
+    "value, code UNINDEXED, recording_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2', prefix = '3')",
+    f"CREATE TRIGGER IF NOT EXISTS observation_fts_insert AFTER INSERT ON observation BEGIN {INSERT} END",
+    f"CREATE TRIGGER IF NOT EXISTS observation_fts_delete AFTER DELETE ON observation BEGIN {DELETE} END",
+    f"CREATE TRIGGER IF NOT EXISTS observation_fts_update AFTER UPDATE ON observation BEGIN {DELETE} {INSERT} END",
+]
+
+
+def upgrade():
+    for statement in DDL:
+        op.execute(statement)
+    op.execute(
+        f"INSERT INTO observation_fts (rowid, value, code, recording_id) "
+        f"SELECT {_rowid('observation')}, value, code, recording_id FROM observation WHERE code IN ({CODES})"
+    )
+
+
+def downgrade():
+    for trigger in ('observation_fts_update', 'observation_fts_delete', 'observation_fts_insert'):
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS observation_fts')
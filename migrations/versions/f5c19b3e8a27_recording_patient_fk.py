@@ -0,0 +1,35 @@
+"""recording patient foreign key and timeline indexes
+
+Revision ID: f5c19b3e8a27
+Revises: e3a7f5c2b814
+Create Date: 2026-10-18 14:26:53.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c19b3e8a27'
+down_revision = 'e3a7f5c2b814'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Recordings whose patient row went missing would violate the new constraint
+    op.execute(
+        "INSERT INTO patient (id) SELECT DISTINCT patient_id FROM recording "
+        "WHERE patient_id NOT IN (SELECT id FROM patient)"
+    )
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.create_foreign_key('fk_recording_patient_id_patient', 'patient', ['patient_id'], ['id'])
+        batch_op.create_index('ix_recording_patient_id_date', ['patient_id', 'date'], unique=False)
+        batch_op.create_index('ix_recording_patient_id_hospitalization_day', ['patient_id', 'hospitalization_day'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('recording', schema=None) as batch_op:
+        batch_op.drop_index('ix_recording_patient_id_hospitalization_day')
+        batch_op.drop_index('ix_recording_patient_id_date')
+        batch_op.drop_constraint('fk_recording_patient_id_patient', type_='foreignkey')
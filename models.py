@@ -1,79 +1,420 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import attribute_keyed_dict
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.types import UserDefinedType
 import datetime
+
+from completeness import KCCQ_FIELDS, missing_fields, required_fields
+from kccq import score_rows
+from recording_schema import RECORDING_FIELDS
 db = SQLAlchemy()
 
 class Recording(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
     recording_type = db.Column(db.String(100), nullable=False)
     hospitalization_day = db.Column(db.Integer, nullable=True)
 
-    # Admission fields
-    age = db.Column(db.Integer, nullable=True)
-    gender = db.Column(db.String(10), nullable=True)
-    height = db.Column(db.Float, nullable=True)
-    diagnosis = db.Column(db.String(500), nullable=True)
-    medication = db.Column(db.String(2000), nullable=True)
-    comorbidities = db.Column(db.String(1000), nullable=True)
-    admission_date = db.Column(db.Date, nullable=True)
-    ntprobnp = db.Column(db.Float, nullable=True)
-    kalium = db.Column(db.Float, nullable=True)
-    natrium = db.Column(db.Float, nullable=True)
-    kreatinin_gfr = db.Column(db.String(100), nullable=True)
-    harnstoff = db.Column(db.Float, nullable=True)
-    hb = db.Column(db.Float, nullable=True)
-    initial_weight = db.Column(db.Float, nullable=True)
-    initial_bp = db.Column(db.String(50), nullable=True)
-
-    # KCCQ Einzelitems (Admission/Discharge)
-    kccq1a = db.Column(db.Integer, nullable=True)
-    kccq1b = db.Column(db.Integer, nullable=True)
-    kccq1c = db.Column(db.Integer, nullable=True)
-    kccq1d = db.Column(db.Integer, nullable=True)
-    kccq1e = db.Column(db.Integer, nullable=True)
-    kccq1f = db.Column(db.Integer, nullable=True)
-    kccq2 = db.Column(db.Integer, nullable=True)
-    kccq3 = db.Column(db.Integer, nullable=True)
-    kccq4 = db.Column(db.Integer, nullable=True)
-    kccq5 = db.Column(db.Integer, nullable=True)
-    kccq6 = db.Column(db.Integer, nullable=True)
-    kccq7 = db.Column(db.Integer, nullable=True)
-    kccq8 = db.Column(db.Integer, nullable=True)
-    kccq9 = db.Column(db.Integer, nullable=True)
-    kccq10 = db.Column(db.Integer, nullable=True)
-    kccq11 = db.Column(db.Integer, nullable=True)
-    kccq12 = db.Column(db.Integer, nullable=True)
-    kccq13 = db.Column(db.Integer, nullable=True)
-    kccq14 = db.Column(db.Integer, nullable=True)
-    kccq15a = db.Column(db.Integer, nullable=True)
-    kccq15b = db.Column(db.Integer, nullable=True)
-    kccq15c = db.Column(db.Integer, nullable=True)
-    kccq15d = db.Column(db.Integer, nullable=True)
-    kccq16 = db.Column(db.Integer, nullable=True)
-
-    # Daily fields
-    weight = db.Column(db.Float, nullable=True)
-    bp = db.Column(db.String(50), nullable=True)
-    pulse = db.Column(db.Integer, nullable=True)
-    medication_changes = db.Column(db.String(2000), nullable=True)
-    kalium_daily = db.Column(db.Float, nullable=True)
-    natrium_daily = db.Column(db.Float, nullable=True)
-    kreatinin_gfr_daily = db.Column(db.String(100), nullable=True)
-    harnstoff_daily = db.Column(db.Float, nullable=True)
-    hb_daily = db.Column(db.Float, nullable=True)
-    ntprobnp_daily = db.Column(db.Float, nullable=True)
-
-    # Discharge fields
-    abschluss_labor = db.Column(db.String(2000), nullable=True)
-    current_weight = db.Column(db.Float, nullable=True)
-    discharge_medication = db.Column(db.String(2000), nullable=True)
-    discharge_date = db.Column(db.Date, nullable=True)
+    # The clinical values the form records (age, labs, KCCQ items, notes, ...) are
+    # Observation rows, read and written through the attributes of the same name
+    # defined below the class
 
-    # Voice sample (shared for all types)
-    voice_sample = db.Column(db.LargeBinary, nullable=True)
+    # KCCQ domain and summary scores (0-100), recomputed on every insert/update (see kccq.py)
+    kccq_physical_limitation = db.Column(db.Float, nullable=True)
+    kccq_symptom_stability = db.Column(db.Float, nullable=True)
+    kccq_symptom_frequency = db.Column(db.Float, nullable=True)
+    kccq_symptom_burden = db.Column(db.Float, nullable=True)
+    kccq_total_symptom = db.Column(db.Float, nullable=True)
+    kccq_self_efficacy = db.Column(db.Float, nullable=True)
+    kccq_quality_of_life = db.Column(db.Float, nullable=True)
+    kccq_social_limitation = db.Column(db.Float, nullable=True)
+    kccq_clinical_summary = db.Column(db.Float, nullable=True)
+    kccq_overall_summary = db.Column(db.Float, nullable=True)
+
+    observations = db.relationship('Observation', collection_class=attribute_keyed_dict('code'),
+                                   cascade='all, delete-orphan', passive_deletes=True,
+                                   back_populates='recording')
+
+    # Voice samples (shared for all types), see RecordingAudio. Deleting a recording leaves its
+    # clips, jobs and features to the database's ON DELETE CASCADE instead of loading them first
+    audios = db.relationship('RecordingAudio', back_populates='recording', cascade='all, delete-orphan',
+                             passive_deletes=True)
 
     # Date of recording
     date = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
 
+    # Set by offline capture (see /sync) so a batch sent twice stores each recording once
+    client_uuid = db.Column(db.String(36), nullable=True, unique=True, index=True)
+
+    # Completeness, kept current on every insert/update (see completeness.py)
+    is_complete = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    missing_fields_count = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_recording_is_complete_patient_id', 'is_complete', 'patient_id'),
+        # Per-patient timelines: filter on patient_id, ordered by date or hospitalization day
+        db.Index('ix_recording_patient_id_date', 'patient_id', 'date'),
+        db.Index('ix_recording_patient_id_hospitalization_day', 'patient_id', 'hospitalization_day'),
+    )
+
+    def audio(self, kind):
+        return next((clip for clip in self.audios if clip.kind == kind), None)
+
+    @property
+    def voice_sample(self):
+        return self.audio('voice_sample')
+
+    def update_completeness(self):
+        values = {field: getattr(self, field, None) for field in required_fields(self.recording_type)}
+        missing = missing_fields(self.recording_type, values)
+        self.missing_fields_count = len(missing)
+        self.is_complete = not missing
+
+    def update_kccq_scores(self):
+        scores, = score_rows([{field: getattr(self, field) for field in KCCQ_FIELDS}])
+        for field, value in scores.items():
+            setattr(self, field, value)
+
+
+# Form fields that stay columns of Recording; every other field is an Observation
+RECORDING_COLUMNS = ('patient_id', 'recording_type', 'hospitalization_day')
+
+# Observation code -> value kind ('integer', 'number', 'text' or 'date'), from the form schema
+OBSERVATION_KINDS = {field.name: field.kind for field in RECORDING_FIELDS if field.name not in RECORDING_COLUMNS}
+
+_DECODE = {
+    'integer': int,
+    'number': float,
+    'text': str,
+    'date': datetime.date.fromisoformat,
+}
+_SQL_TYPES = {'integer': db.Integer, 'number': db.Float, 'text': db.String, 'date': db.Date}
+
+
+class _Untyped(UserDefinedType):
+    """A column without type affinity: SQLite stores integers and reals in their
+    compact native encoding and text as text, with no conversion."""
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return 'BLOB'
+
+
+def encode_observation(value):
+    """The stored form of a field value: dates as ISO text, everything else as is."""
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+
+def decode_observation(code, value):
+    """The field value of a stored observation ``value`` of ``code``."""
+    return _DECODE[OBSERVATION_KINDS[code]](value)
+
+
+class Observation(db.Model):
+    """One clinical value of a recording, keyed by (recording_id, code).
+
+    Only the fields a recording actually has get a row, and a new field only
+    needs an entry in recording_schema.RECORDING_FIELDS, not a migration.
+    """
+    recording_id = db.Column(db.Integer, db.ForeignKey('recording.id', ondelete='CASCADE'), primary_key=True)
+    code = db.Column(db.String(40), primary_key=True)
+    value = db.Column(_Untyped, nullable=False)
+
+    recording = db.relationship('Recording', back_populates='observations')
+
+    __table_args__ = (
+        # Per-metric scans across the cohort
+        db.Index('ix_observation_code_recording_id', 'code', 'recording_id'),
+        {'sqlite_with_rowid': False},
+    )
+
+    @property
+    def decoded(self):
+        return decode_observation(self.code, self.value)
+
+
+def _observation_attribute(code):
+    def get(self):
+        observation = self.observations.get(code)
+        return None if observation is None else observation.decoded
+
+    def set(self, value):
+        if value is None or value == '':
+            self.observations.pop(code, None)
+        elif code in self.observations:
+            self.observations[code].value = encode_observation(value)
+        else:
+            self.observations[code] = Observation(code=code, value=encode_observation(value))
+        if self.id is not None:
+            # The change is in the observations; have the before_update hook rescore the recording
+            flag_modified(self, 'missing_fields_count')
+
+    return property(get, set, doc=f'The {code!r} observation, or None.')
+
+
+for _code in OBSERVATION_KINDS:
+    setattr(Recording, _code, _observation_attribute(_code))
+
+
+def observation_column(code):
+    """Correlated subquery selecting one observation of ``Recording`` as a typed column labelled ``code``."""
+    return db.type_coerce(
+        db.select(Observation.value).where(
+            Observation.recording_id == Recording.id, Observation.code == code
+        ).scalar_subquery(),
+        _SQL_TYPES[OBSERVATION_KINDS[code]]
+    ).label(code)
+
+
+def split_observations(row):
+    """Pop the observation fields off a column mapping; returns ``[{'code', 'value'}]`` for the non-empty ones."""
+    observations = []
+    for code in OBSERVATION_KINDS:
+        value = row.pop(code, None)
+        if value is not None and value != '':
+            observations.append({'code': code, 'value': encode_observation(value)})
+    return observations
+
+
+# Standardized speech tasks recorded with the form; the form input name is the kind
+AUDIO_KINDS = {
+    'voice_sample': 'Voice Sample (standardized sentence)',
+    'story_telling': 'Voice Sample (story telling)',
+}
+
+
+class RecordingAudio(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recording_id = db.Column(db.Integer, db.ForeignKey('recording.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+
+    # The bytes live in the audio store, keyed by their SHA-256 digest. Once the
+    # worker has normalised the clip these describe the canonical rendition and
+    # the upload as received moves to original_*
+    sha256 = db.Column(db.String(64), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    mime = db.Column(db.String(100), nullable=True)
+    duration = db.Column(db.Float, nullable=True)
+    original_sha256 = db.Column(db.String(64), nullable=True)
+    original_size = db.Column(db.Integer, nullable=True)
+    original_mime = db.Column(db.String(100), nullable=True)
+    sample_rate = db.Column(db.Integer, nullable=True)  # as recorded
+    channels = db.Column(db.Integer, nullable=True)
+    peaks = db.deferred(db.Column(db.JSON, nullable=True))  # waveform peaks for the player
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+
+    recording = db.relationship('Recording', back_populates='audios')
+    jobs = db.relationship('AudioJob', back_populates='audio', cascade='all, delete-orphan', passive_deletes=True)
+    features = db.relationship('VoiceFeatures', back_populates='audio', uselist=False, cascade='all, delete-orphan',
+                               passive_deletes=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('recording_id', 'kind', name='uq_recording_audio_recording_id_kind'),
+    )
+
+
+class AudioJob(db.Model):
+    """Queued background work for one audio clip, processed by ``flask process-audio``."""
+    id = db.Column(db.Integer, primary_key=True)
+    audio_id = db.Column(db.Integer, db.ForeignKey('recording_audio.id', ondelete='CASCADE'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    not_before = db.Column(db.DateTime, nullable=True)  # a failed job waits until then for its next attempt
+
+    audio = db.relationship('RecordingAudio', back_populates='jobs')
+
+    __table_args__ = (
+        db.Index('ix_audio_job_status_id', 'status', 'id'),
+    )
+
+
+class VoiceFeatures(db.Model):
+    """Voice biomarkers computed from one audio clip (see voice_features.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    audio_id = db.Column(db.Integer, db.ForeignKey('recording_audio.id', ondelete='CASCADE'), nullable=False, unique=True)
+    duration = db.Column(db.Float, nullable=True)
+    rms_energy = db.Column(db.Float, nullable=True)
+    f0_mean = db.Column(db.Float, nullable=True)
+    f0_std = db.Column(db.Float, nullable=True)
+    jitter = db.Column(db.Float, nullable=True)
+    shimmer = db.Column(db.Float, nullable=True)
+    pause_ratio = db.Column(db.Float, nullable=True)
+    mfcc_means = db.Column(db.JSON, nullable=True)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+
+    audio = db.relationship('RecordingAudio', back_populates='features')
+
+
+Recording.has_voice_sample = db.column_property(
+    db.exists().where(RecordingAudio.recording_id == Recording.id, RecordingAudio.kind == 'voice_sample')
+)
+
+
+@event.listens_for(Recording, 'before_insert')
+@event.listens_for(Recording, 'before_update')
+def _update_derived_fields(mapper, connection, target):
+    target.update_completeness()
+    target.update_kccq_scores()
+
+
+def derive_columns(rows, voice_samples=None):
+    """Fill completeness and KCCQ scores into plain field mappings, for Core inserts that skip the hooks above.
+
+    The mappings still hold the observation fields; split_observations() takes them out before the insert.
+
+    ``voice_samples`` says per row whether it gets a standardized-sentence clip (default: none do).
+    """
+    voice_samples = voice_samples or [False] * len(rows)
+    for row, scores, has_voice_sample in zip(rows, score_rows(rows), voice_samples):
+        row.update(scores)
+        missing = missing_fields(row['recording_type'], dict(row, voice_sample=has_voice_sample))
+        row['missing_fields_count'] = len(missing)
+        row['is_complete'] = not missing
+    return rows
+
+
 class Patient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+
+
+class PatientSummary(db.Model):
+    """Per-patient aggregates behind the cohort analytics, maintained by analytics.refresh_patients()."""
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id', ondelete='CASCADE'), primary_key=True)
+    recordings = db.Column(db.Integer, nullable=False)
+    complete_recordings = db.Column(db.Integer, nullable=False)
+    admission_recordings = db.Column(db.Integer, nullable=False)
+    daily_recordings = db.Column(db.Integer, nullable=False)
+    discharge_recordings = db.Column(db.Integer, nullable=False)
+    admission_date = db.Column(db.Date, nullable=True)
+    discharge_date = db.Column(db.Date, nullable=True)
+    # Days from admission_date to discharge_date, NULL until both are recorded
+    stay_days = db.Column(db.Integer, nullable=True)
+    # KCCQ overall summary of the first admission and the last discharge recording
+    kccq_admission = db.Column(db.Float, nullable=True)
+    kccq_discharge = db.Column(db.Float, nullable=True)
+
+
+class PatientFieldSummary(db.Model):
+    """How many of a patient's recordings of a type miss a required field; only fields missed at least once."""
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id', ondelete='CASCADE'), primary_key=True)
+    recording_type = db.Column(db.String(100), primary_key=True)
+    field = db.Column(db.String(40), primary_key=True)
+    missing = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        {'sqlite_with_rowid': False},
+    )
+
+
+# Numeric measurements that are split across the admission, daily and discharge
+# fields, as (metric, sources); the first source present is the value, in the
+# order the patient cards merge them
+OBSERVATION_METRICS = [
+    ('weight', ('weight', 'current_weight', 'initial_weight')),
+    ('ntprobnp', ('ntprobnp', 'ntprobnp_daily')),
+    ('kalium', ('kalium', 'kalium_daily')),
+    ('natrium', ('natrium', 'natrium_daily')),
+    ('harnstoff', ('harnstoff', 'harnstoff_daily')),
+    ('hb', ('hb', 'hb_daily')),
+    ('pulse', ('pulse',)),
+    ('kccq_clinical_summary', ('kccq_clinical_summary',)),
+    ('kccq_overall_summary', ('kccq_overall_summary',)),
+]
+
+
+def observation_view_sql(metrics=OBSERVATION_METRICS):
+    """SELECT for the recording_observation view: one (patient, recording, metric, value) row per measurement.
+
+    A metric's sources are observation codes, joined by primary key, or columns
+    still on recording (the KCCQ summaries); the first one present wins.
+    """
+    parts = []
+    for metric, sources in metrics:
+        joins, values = [], []
+        # One source needs the row, so it is an inner join; CROSS JOIN keeps recording as the
+        # outer loop, where SQLite would otherwise scan that code across the whole cohort
+        join = 'CROSS JOIN' if len(sources) == 1 else 'LEFT JOIN'
+        for position, source in enumerate(sources):
+            if source in OBSERVATION_KINDS:
+                alias = f'o{position}'
+                joins.append(f"{join} observation {alias} ON {alias}.recording_id = r.id AND {alias}.code = '{source}'")
+                values.append(f'{alias}.value')
+            else:
+                values.append(f'r.{source}')
+        value = f'COALESCE({", ".join(values)})' if len(values) > 1 else values[0]
+        parts.append(
+            f"SELECT r.patient_id, r.id AS recording_id, r.recording_type, r.hospitalization_day, r.date, "
+            f"'{metric}' AS metric, {value} AS value FROM recording r {' '.join(joins)} WHERE {value} IS NOT NULL"
+        )
+    return '\nUNION ALL\n'.join(parts)
+
+
+# Read-only long format of the measurements above. Not part of the metadata, so
+# create_all() does not make it a table; the DDL hooks below create the view
+recording_observation = db.table(
+    'recording_observation',
+    db.column('patient_id', db.Integer),
+    db.column('recording_id', db.Integer),
+    db.column('recording_type', db.String),
+    db.column('hospitalization_day', db.Integer),
+    db.column('date', db.DateTime),
+    db.column('metric', db.String),
+    db.column('value', db.Float),
+)
+
+event.listen(db.metadata, 'after_create',
+             db.DDL(f'CREATE VIEW IF NOT EXISTS recording_observation AS\n{observation_view_sql()}'))
+event.listen(db.metadata, 'before_drop', db.DDL('DROP VIEW IF EXISTS recording_observation'))
+
+
+# Free-text fields indexed for full-text search. The position (1-based) is part of
+# the index rowid (recording_id * 8 + position), so append new fields, never reorder
+# them, and keep to 7: an 8th would take the rowids of the next recording
+TEXT_SEARCH_FIELDS = (
+    'diagnosis', 'medication', 'comorbidities', 'medication_changes', 'discharge_medication', 'abschluss_labor',
+)
+
+
+def text_search_ddl(fields=TEXT_SEARCH_FIELDS):
+    """CREATE statements for the observation_fts FTS5 index and the triggers that keep it in step with observation.
+
+    One index row per text observation, so a search ranks all fields together;
+    the stored code and recording_id say where a hit came from.
+    """
+    assert len(fields) < 8, 'the observation_fts rowid has room for 7 fields per recording'
+    codes = ', '.join(f"'{field}'" for field in fields)
+
+    def rowid(row):
+        positions = ' '.join(f"WHEN '{field}' THEN {position}" for position, field in enumerate(fields, 1))
+        return f'{row}.recording_id * 8 + CASE {row}.code {positions} END'
+
+    insert = (f"INSERT INTO observation_fts (rowid, value, code, recording_id) "
+              f"SELECT {rowid('new')}, new.value, new.code, new.recording_id WHERE new.code IN ({codes});")
+    delete = f"DELETE FROM observation_fts WHERE rowid = {rowid('old')};"
+    return [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS observation_fts USING fts5("
+        "value, code UNINDEXED, recording_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2', prefix = '3')",
+        f"CREATE TRIGGER IF NOT EXISTS observation_fts_insert AFTER INSERT ON observation BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS observation_fts_delete AFTER DELETE ON observation BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS observation_fts_update AFTER UPDATE ON observation BEGIN {delete} {insert} END",
+    ]
+
+
+# Queried like a table; created and dropped by the DDL hooks below, like the view above
+observation_fts = db.table(
+    'observation_fts',
+    db.column('rowid', db.Integer),
+    db.column('value', db.String),
+    db.column('code', db.String),
+    db.column('recording_id', db.Integer),
+    db.column('rank', db.Float),
+)
+
+for _statement in text_search_ddl():
+    event.listen(db.metadata, 'after_create', db.DDL(_statement))
+event.listen(db.metadata, 'before_drop', db.DDL('DROP TABLE IF EXISTS observation_fts'))
@@ -0,0 +1,183 @@
+"""Declarative schema of the recording form: field types, ranges and choices.
+
+Used by the HTML form handler and the bulk JSON/NDJSON import, so both store
+the same typed values. Kept free of model imports like completeness.py.
+"""
+import datetime
+import math
+
+from completeness import KCCQ_FIELDS
+from kccq import ANSWER_CODES
+
+RECORDING_TYPES = ("admission", "daily", "discharge")
+
+
+class ValidationError(ValueError):
+    """Raised with every invalid field at once; ``errors`` maps field name to message."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(f'{field}: {message}' for field, message in errors.items()))
+        self.errors = errors
+
+
+def _integer(value):
+    if isinstance(value, bool):
+        raise ValueError('must be a whole number')
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError('must be a whole number')
+        return int(value)
+    if isinstance(value, int):
+        return value
+    return int(str(value).strip())
+
+
+def _number(value):
+    if isinstance(value, bool):
+        raise ValueError('must be a number')
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        # Accept the decimal comma German keyboards produce
+        number = float(str(value).strip().replace(',', '.'))
+    if not math.isfinite(number):
+        raise ValueError('must be a finite number')
+    return number
+
+
+def _text(value):
+    return str(value).strip()
+
+
+def _date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    value = str(value).strip()
+    for parse in (datetime.date.fromisoformat, lambda v: datetime.datetime.strptime(v, '%d.%m.%Y').date()):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    raise ValueError('must be a date (YYYY-MM-DD)')
+
+
+def _datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError('must be a date and time (YYYY-MM-DDTHH:MM)')
+
+
+_TYPE_MESSAGES = {_integer: 'must be a whole number', _number: 'must be a number'}
+_KINDS = {_integer: 'integer', _number: 'number', _text: 'text', _date: 'date', _datetime: 'datetime'}
+
+
+class Field:
+    def __init__(self, name, convert, required=False, minimum=None, maximum=None, choices=None, max_length=None):
+        self.name = name
+        self.convert = convert
+        self.required = required
+        self.minimum = minimum
+        self.maximum = maximum
+        self.choices = choices
+        self.max_length = max_length
+
+    @property
+    def kind(self):
+        """``'integer'``, ``'number'``, ``'text'``, ``'date'`` or ``'datetime'``."""
+        return _KINDS[self.convert]
+
+    def parse(self, raw):
+        """Convert one raw value; returns None for empty input and raises ValueError with a message."""
+        if raw is None or (isinstance(raw, str) and not raw.strip()):
+            if self.required:
+                raise ValueError('is required')
+            return None
+        try:
+            value = self.convert(raw)
+        except (TypeError, ValueError) as exc:
+            raise ValueError(_TYPE_MESSAGES.get(self.convert) or str(exc))
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f'must be one of {", ".join(str(choice) for choice in self.choices)}')
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f'must be at least {self.minimum}')
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError(f'must be at most {self.maximum}')
+        if self.max_length is not None and len(value) > self.max_length:
+            raise ValueError(f'must be at most {self.max_length} characters')
+        return value
+
+
+RECORDING_FIELDS = [
+    Field('patient_id', _integer, required=True, minimum=1),
+    Field('recording_type', _text, required=True, choices=RECORDING_TYPES),
+    Field('hospitalization_day', _integer, minimum=1, maximum=365),
+
+    # Admission fields
+    Field('age', _integer, minimum=0, maximum=130),
+    Field('gender', _text, choices=('m', 'f', 'd')),
+    Field('height', _number, minimum=30, maximum=250),
+    Field('diagnosis', _text, max_length=500),
+    Field('medication', _text, max_length=2000),
+    Field('comorbidities', _text, max_length=1000),
+    Field('admission_date', _date),
+    Field('ntprobnp', _number, minimum=0),
+    Field('kalium', _number, minimum=0, maximum=15),
+    Field('natrium', _number, minimum=0, maximum=250),
+    Field('kreatinin_gfr', _text, max_length=100),
+    Field('harnstoff', _number, minimum=0),
+    Field('hb', _number, minimum=0, maximum=30),
+    Field('initial_weight', _number, minimum=0, maximum=400),
+    Field('initial_bp', _text, max_length=50),
+] + [
+    # KCCQ items (admission/discharge)
+    Field(field, _integer, choices=tuple(ANSWER_CODES[field])) for field in KCCQ_FIELDS
+] + [
+    # Daily fields
+    Field('weight', _number, minimum=0, maximum=400),
+    Field('bp', _text, max_length=50),
+    Field('pulse', _integer, minimum=0, maximum=300),
+    Field('medication_changes', _text, max_length=2000),
+    Field('kalium_daily', _number, minimum=0, maximum=15),
+    Field('natrium_daily', _number, minimum=0, maximum=250),
+    Field('kreatinin_gfr_daily', _text, max_length=100),
+    Field('harnstoff_daily', _number, minimum=0),
+    Field('hb_daily', _number, minimum=0, maximum=30),
+    Field('ntprobnp_daily', _number, minimum=0),
+
+    # Discharge fields
+    Field('abschluss_labor', _text, max_length=2000),
+    Field('current_weight', _number, minimum=0, maximum=400),
+    Field('discharge_medication', _text, max_length=2000),
+    Field('discharge_date', _date),
+]
+
+# Only accepted from the bulk import: when the recording was taken on the device
+DATE_FIELD = Field('date', _datetime)
+
+
+def parse_recording(data, fields=RECORDING_FIELDS):
+    """Validate ``data`` and return a dict with a typed value (or None) for every field.
+
+    ``data`` is a plain mapping (JSON) or a form MultiDict. The form repeats
+    some inputs (lab values, KCCQ) in the admission and discharge sections,
+    so for a MultiDict the first non-empty value of a name wins.
+    """
+    values = {}
+    errors = {}
+    for field in fields:
+        if hasattr(data, 'getlist'):
+            raw = next((value for value in data.getlist(field.name) if value.strip()), None)
+        else:
+            raw = data.get(field.name)
+        try:
+            values[field.name] = field.parse(raw)
+        except ValueError as exc:
+            errors[field.name] = str(exc)
+    if errors:
+        raise ValidationError(errors)
+    return values
@@ -0,0 +1,110 @@
+"""SQLite tuning for concurrent use by several request threads.
+
+``init_app`` sets ``SQLITE_DATABASE_PRAGMAS`` (WAL, incremental auto_vacuum),
+which persist in the database file, once at startup. Every new connection
+gets ``SQLITE_PRAGMAS`` (busy timeout first, synchronous=NORMAL, mmap, page
+cache) and enforces foreign keys (the schema's ON DELETE CASCADE relies on
+it), and write requests open their transaction with ``BEGIN IMMEDIATE``. A
+deferred transaction that reads before it writes (as the recording form
+does) can fail with "database is locked" under WAL without ever waiting on
+the busy timeout; taking the write lock up front makes it queue behind the
+busy timeout instead. SQLite's busy handler polls rather than queues, so a
+waiter can be overtaken until its timeout runs out; write requests of one
+process therefore also wait their turn on a lock held until the connection
+goes back to the pool.
+"""
+import threading
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+# Stored in the database file, so set once at startup rather than on every connection
+PRODUCTION_DATABASE_PRAGMAS = {
+    # Only takes effect on a new database or at the next VACUUM (see compaction.py)
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+}
+
+# Per connection, in this order: busy_timeout comes first so that any later
+# pragma that needs a lock waits for it instead of failing at once
+PRODUCTION_PRAGMAS = {
+    'busy_timeout': 10000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative means KiB, so 64 MiB
+}
+
+# Passed to create_engine through SQLALCHEMY_ENGINE_OPTIONS
+PRODUCTION_ENGINE_OPTIONS = {
+    'pool_size': 8,
+    'max_overflow': 16,
+    'pool_timeout': 30,
+}
+
+_SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def init_app(app, db):
+    """Set the database pragmas and attach the connection hooks to ``db``'s engine. Call after ``db.init_app(app)``."""
+    app.config.setdefault('SQLITE_DATABASE_PRAGMAS', PRODUCTION_DATABASE_PRAGMAS)
+    app.config.setdefault('SQLITE_PRAGMAS', PRODUCTION_PRAGMAS)
+    app.config.setdefault('SQLITE_IMMEDIATE_WRITES', True)
+    app.config.setdefault('SQLITE_FOREIGN_KEYS', True)
+    pragmas = dict(app.config['SQLITE_PRAGMAS'])
+    if app.config['SQLITE_FOREIGN_KEYS']:
+        pragmas['foreign_keys'] = 'ON'
+    immediate_writes = app.config['SQLITE_IMMEDIATE_WRITES']
+    busy_timeout = int(pragmas.get('busy_timeout', 0)) / 1000
+    write_lock = threading.Lock()
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy's begin event, not the sqlite3 module, decide when transactions start
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def _on_begin(conn):
+        if conn.get_execution_options().get('isolation_level') == 'AUTOCOMMIT':
+            return
+        immediate = immediate_writes and has_request_context() and request.method not in _SAFE_METHODS
+        if not immediate:
+            conn.exec_driver_sql('BEGIN')
+            return
+        # Past the busy timeout BEGIN IMMEDIATE would fail anyway, so it gets its own try without the lock
+        info = conn.connection.info
+        if not info.get('write_lock') and write_lock.acquire(timeout=busy_timeout):
+            info['write_lock'] = True
+        try:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+        except Exception:
+            _release(info)
+            raise
+
+    @event.listens_for(engine, 'checkin')
+    def _on_checkin(dbapi_connection, connection_record):
+        # Committed or rolled back by now; the pool resets a connection before checking it in
+        _release(connection_record.info)
+
+    def _release(info):
+        if info.pop('write_lock', False):
+            write_lock.release()
+
+    # On the DBAPI connection, outside any transaction: journal_mode cannot change inside one.
+    # The connect hook above has already set busy_timeout, so this waits for other workers
+    dbapi_connection = engine.raw_connection()
+    try:
+        cursor = dbapi_connection.cursor()
+        for name, value in app.config['SQLITE_DATABASE_PRAGMAS'].items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    finally:
+        dbapi_connection.close()
@@ -0,0 +1,243 @@
+// Clip uploads and the offline capture queue for the recording page.
+//
+// Recordings saved without a connection are kept in IndexedDB, form values and
+// clips together, each under a client-generated UUID. syncQueue() uploads the
+// clips with the resumable upload API and sends the recordings to /sync in
+// batches. The server stores every UUID at most once, so a batch whose
+// response got lost is simply sent again. No DOM access: the service worker
+// (sw.js) imports this file to sync in the background.
+
+const UPLOADS_URL = '/uploads';
+const SYNC_URL = '/sync';
+const SYNC_BATCH = 20;
+const QUEUE_DB = 'capture';
+const QUEUE_STORE = 'recordings';
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+class UploadGone extends Error {}
+
+// Streams recorded chunks to /uploads/<id> while recording. Failed chunks are
+// retried from the offset the server reports, so nothing recorded is sent twice
+// or lost when the connection drops for a while.
+class ChunkedUpload {
+  constructor(kind, mime) {
+    this.kind = kind;
+    this.mime = mime;
+    this.parts = [];
+    this.sent = 0;
+    this.id = null;
+    this.sending = null;
+  }
+
+  async start() {
+    const response = await fetch(UPLOADS_URL, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ kind: this.kind, mime: this.mime }),
+    });
+    if (!response.ok) throw new Error(`upload could not be started (${response.status})`);
+    this.id = (await response.json()).upload_id;
+  }
+
+  // Continue an upload started earlier; returns true if it is already complete
+  async resume(id) {
+    const response = await fetch(`${UPLOADS_URL}/${id}`);
+    if (response.status === 404) throw new UploadGone(id);
+    if (!response.ok) throw new Error(`upload status unavailable (${response.status})`);
+    const info = await response.json();
+    this.id = id;
+    this.sent = info.offset;
+    return info.complete;
+  }
+
+  add(blob) {
+    this.parts.push(blob);
+    if (!this.sending) this.sending = this.flush().finally(() => { this.sending = null; });
+    return this.sending;
+  }
+
+  async flush() {
+    for (let attempt = 0; ; attempt++) {
+      const pending = new Blob(this.parts).slice(this.sent);
+      if (!pending.size) return;
+      try {
+        const response = await fetch(`${UPLOADS_URL}/${this.id}`, {
+          method: 'PATCH',
+          headers: { 'Upload-Offset': String(this.sent), 'Content-Type': 'application/octet-stream' },
+          body: pending,
+        });
+        if (response.status === 404) throw new UploadGone(this.id);
+        if (response.ok || response.status === 409) {
+          this.sent = (await response.json()).offset;
+          attempt = -1;
+          continue;
+        }
+        throw new Error(`chunk rejected (${response.status})`);
+      } catch (error) {
+        if (error instanceof UploadGone || attempt >= 5) throw error;
+        await sleep(500 * 2 ** attempt);
+        // Ask where the server got to; a dropped request may have stored part of the chunk
+        const status = await fetch(`${UPLOADS_URL}/${this.id}`).catch(() => null);
+        if (status && status.ok) this.sent = (await status.json()).offset;
+      }
+    }
+  }
+
+  async finish() {
+    while (this.sending) await this.sending;
+    await this.flush();
+    const response = await fetch(`${UPLOADS_URL}/${this.id}/complete`, { method: 'POST' });
+    if (response.status === 404) throw new UploadGone(this.id);
+    if (!response.ok) throw new Error(`upload could not be completed (${response.status})`);
+    return response.json();
+  }
+}
+
+function openQueue() {
+  return new Promise((resolve, reject) => {
+    const request = indexedDB.open(QUEUE_DB, 1);
+    request.onupgradeneeded = () => request.result.createObjectStore(QUEUE_STORE, { keyPath: 'client_uuid' });
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+async function queueTransaction(mode, work) {
+  const db = await openQueue();
+  try {
+    return await new Promise((resolve, reject) => {
+      const tx = db.transaction(QUEUE_STORE, mode);
+      const result = work(tx.objectStore(QUEUE_STORE));
+      tx.oncomplete = () => resolve(result && 'result' in result ? result.result : undefined);
+      tx.onerror = tx.onabort = () => reject(tx.error);
+    });
+  } finally {
+    db.close();
+  }
+}
+
+// item: { recording: {field: value}, clips: {kind: Blob}, uploads: {kind: upload id} }; returns the stored entry.
+// Clips are kept even when their upload is complete, until the server has stored the recording.
+async function queueRecording(item) {
+  const entry = {
+    client_uuid: crypto.randomUUID(),
+    recording: Object.assign({ date: localIsoDateTime(new Date()) }, item.recording),
+    clips: item.clips || {},
+    uploads: item.uploads || {},
+    status: 'pending',
+    errors: null,
+    queued_at: Date.now(),
+  };
+  await queueTransaction('readwrite', store => store.put(entry));
+  return entry;
+}
+
+const queuedRecordings = () => queueTransaction('readonly', store => store.getAll());
+const saveQueued = (entry) => queueTransaction('readwrite', store => store.put(entry));
+const removeQueued = (clientUuid) => queueTransaction('readwrite', store => store.delete(clientUuid));
+
+// The server stores naive local times, like datetime.now() does for online saves
+function localIsoDateTime(date) {
+  const local = new Date(date.getTime() - date.getTimezoneOffset() * 60000);
+  return local.toISOString().slice(0, 19);
+}
+
+// Upload the entry's clips that have no finished upload yet; upload ids are
+// saved as soon as they exist so an interrupted sync resumes instead of restarting
+async function uploadClips(entry) {
+  for (const [kind, blob] of Object.entries(entry.clips)) {
+    const upload = new ChunkedUpload(kind, blob.type || 'audio/webm');
+    let complete = false;
+    if (entry.uploads[kind]) {
+      try {
+        complete = await upload.resume(entry.uploads[kind]);
+      } catch (error) {
+        if (!(error instanceof UploadGone)) throw error;
+        delete entry.uploads[kind];
+      }
+    }
+    if (!entry.uploads[kind]) {
+      await upload.start();
+      entry.uploads[kind] = upload.id;
+      await saveQueued(entry);
+    }
+    if (!complete) {
+      await upload.add(blob);
+      await upload.finish();
+    }
+  }
+}
+
+let syncing = null;
+
+// Send every pending entry; resolves to { synced, rejected, pending } counts
+function syncQueue() {
+  if (!syncing) syncing = runSync().finally(() => { syncing = null; });
+  return syncing;
+}
+
+async function runSync() {
+  const counts = { synced: 0, rejected: 0, pending: 0 };
+  const entries = await queuedRecordings();
+  const pending = entries.filter(entry => entry.status === 'pending');
+  counts.rejected = entries.length - pending.length;
+
+  for (let start = 0; start < pending.length; start += SYNC_BATCH) {
+    const batch = [];
+    for (const entry of pending.slice(start, start + SYNC_BATCH)) {
+      try {
+        await uploadClips(entry);
+        batch.push(entry);
+      } catch (error) {
+        // Still offline or the upload failed; the entry waits for the next sync
+        counts.pending++;
+      }
+    }
+    if (!batch.length) continue;
+
+    let results;
+    try {
+      const response = await fetch(SYNC_URL, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          items: batch.map(({ client_uuid, recording, uploads }) => ({ client_uuid, recording, uploads })),
+        }),
+      });
+      if (!response.ok) throw new Error(`sync failed (${response.status})`);
+      results = (await response.json()).results;
+    } catch (error) {
+      counts.pending += batch.length;
+      continue;
+    }
+
+    for (const [index, result] of results.entries()) {
+      const entry = batch[index];
+      if (result.status === 'created' || result.status === 'duplicate') {
+        await removeQueued(entry.client_uuid);
+        counts.synced++;
+      } else if (result.status === 'upload_missing') {
+        // The uploads expired on the server; upload the clips again from the blobs kept with the entry.
+        // Without a blob the clip is lost, and the recording must not be stored without it.
+        const lost = Object.keys(entry.uploads).filter(kind => !entry.clips[kind]);
+        if (lost.length) {
+          entry.status = 'invalid';
+          entry.errors = Object.fromEntries(lost.map(kind => [kind, 'upload expired, the clip has to be recorded again']));
+          counts.rejected++;
+        } else {
+          entry.uploads = {};
+          counts.pending++;
+        }
+        await saveQueued(entry);
+      } else {
+        // Kept, not dropped: the clinician has to see and correct it
+        entry.status = 'invalid';
+        entry.errors = result.errors;
+        await saveQueued(entry);
+        counts.rejected++;
+      }
+    }
+  }
+  return counts;
+}
@@ -0,0 +1,61 @@
+// Service worker for offline capture, served at /sw.js so its scope is the whole site.
+//
+// Keeps the recording page and its assets available without a connection
+// (network first for the page, cache first for the assets) and, where the
+// browser supports Background Sync, sends the queue once the connection is back.
+
+importScripts('/static/capture.js');
+
+const CACHE = 'capture-v1';
+const PAGE = '/recording';
+const ASSETS = [
+  '/static/style.css',
+  '/static/capture.js',
+  'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+  'https://cdn.jsdelivr.net/npm/bootstrap-icons/font/bootstrap-icons.css',
+  'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+];
+
+self.addEventListener('install', event => {
+  event.waitUntil(caches.open(CACHE).then(cache => cache.addAll([PAGE, ...ASSETS])).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys.filter(key => key !== CACHE).map(key => caches.delete(key))))
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+
+  if (request.mode === 'navigate' && url.origin === self.location.origin && url.pathname === PAGE) {
+    // Any /recording?patient_id=... falls back to the cached blank form
+    event.respondWith(
+      fetch(request)
+        .then(response => {
+          if (response.ok && !url.search) {
+            const copy = response.clone();
+            caches.open(CACHE).then(cache => cache.put(PAGE, copy));
+          }
+          return response;
+        })
+        .catch(() => caches.match(PAGE))
+    );
+  } else if (ASSETS.includes(url.origin === self.location.origin ? url.pathname : url.href)) {
+    event.respondWith(caches.match(request).then(cached => cached || fetch(request)));
+  }
+});
+
+self.addEventListener('sync', event => {
+  if (event.tag === 'capture-sync') {
+    event.waitUntil(syncQueue().then(counts => {
+      // Rejecting makes the browser retry the sync later
+      if (counts.pending) throw new Error(`${counts.pending} recording(s) still queued`);
+    }));
+  }
+});
@@ -0,0 +1,96 @@
+"""Compiled templates on disk and rendered dashboard patient cards in memory.
+
+Jinja compiles a template to Python the first time a process renders it, which
+is most of a new worker's first dashboard or recording form request. With the
+bytecode cache the compiled code is kept under ``TEMPLATE_CACHE_DIR`` and the
+next worker loads it instead; ``flask compile-templates`` fills it at deploy
+time. Jinja checks each entry against the template source, so an edited
+template is compiled again.
+
+Recordings are added and deleted but never edited, so a patient's card only
+changes with the patient's recording version: the number of recordings, the
+highest id and the newest date. Cards are kept per process, keyed by patient,
+tab and that version, which is read for a whole page in one query on
+ix_recording_patient_id_date. A write in another worker changes the version,
+so its cards are not served stale; writes in this process also drop the
+patient's cards at once (invalidate()).
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache
+
+from models import Recording, db
+
+DEFAULT_CARD_CACHE_SIZE = 2000
+
+_cards = OrderedDict()  # least recently used first
+_cards_lock = threading.Lock()
+
+
+def init_app(app):
+    app.config.setdefault('TEMPLATE_CACHE_DIR', os.path.join(app.instance_path, 'templates'))
+    # Cards kept per process; 0 renders every card on every request
+    app.config.setdefault('PATIENT_CARD_CACHE_SIZE', DEFAULT_CARD_CACHE_SIZE)
+    if app.config['TEMPLATE_CACHE_DIR']:
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+
+
+def compile_templates(app):
+    """Compile every template of ``app`` into the bytecode cache and return their names."""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+
+def recording_versions(patient_ids):
+    """``(recordings, highest id, newest date)`` of each patient in ``patient_ids`` that has recordings."""
+    rows = db.session.execute(
+        db.select(Recording.patient_id, db.func.count(), db.func.max(Recording.id), db.func.max(Recording.date))
+        .where(Recording.patient_id.in_(patient_ids)).group_by(Recording.patient_id)
+    )
+    return {patient_id: tuple(version) for patient_id, *version in rows}
+
+
+def patient_cards(tab, patient_ids, render):
+    """The rendered card of each patient in ``patient_ids`` on a dashboard tab, by patient id.
+
+    ``render(patient_ids)`` renders the cards that are not cached, by patient id.
+    """
+    if not patient_ids:
+        return {}
+    size = current_app.config['PATIENT_CARD_CACHE_SIZE']
+    if not size:
+        return render(patient_ids)
+    # Read before rendering: a card that sees a newer write is cached under an
+    # older version, which is never looked up again, instead of the other way round
+    versions = recording_versions(patient_ids)
+    database = str(db.engine.url)
+    keys = {patient_id: (database, patient_id, tab, versions.get(patient_id)) for patient_id in patient_ids}
+    cards = {}
+    with _cards_lock:
+        for patient_id, key in keys.items():
+            card = _cards.get(key)
+            if card is not None:
+                _cards.move_to_end(key)
+                cards[patient_id] = card
+    missing = [patient_id for patient_id in patient_ids if patient_id not in cards]
+    if missing:
+        rendered = render(missing)
+        with _cards_lock:
+            for patient_id in missing:
+                _cards[keys[patient_id]] = cards[patient_id] = rendered[patient_id]
+            while len(_cards) > size:
+                _cards.popitem(last=False)
+    return cards
+
+
+def invalidate(patient_ids):
+    """Drop this process's cards of ``patient_ids``. Call once the write is committed."""
+    with _cards_lock:
+        for key in [key for key in _cards if key[1] in patient_ids]:
+            del _cards[key]
@@ -2,6 +2,11 @@ from flask import Flask
 
 from flask_migrate import Migrate
 from models import db
+import audio_store
+import commands
+import sqlite_profile
+import instrumentation
+import template_cache
 import sys
 import os
 
@@ -12,18 +17,31 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 migrate = Migrate()  # Initialize Flask-Migrate
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
 
     # Configure the database URI (replace with your database URI)
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'  
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.secret_key = 'the random string'
+    # Reject oversized uploads from the Content-Length header before reading the body
+    app.config['MAX_CONTENT_LENGTH'] = 128 * 1024 * 1024
+    # Connection pool for the SQLite production profile, see sqlite_profile.py
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_profile.PRODUCTION_ENGINE_OPTIONS
+    # Any setting can come from FLASK_* environment variables, e.g. FLASK_INSTRUMENTATION=true
+    app.config.from_prefixed_env()
+    if config:
+        app.config.update(config)
     import models
 
     # Initialize extensions
     db.init_app(app)
+    sqlite_profile.init_app(app, db)
+    instrumentation.init_app(app, db)
     migrate.init_app(app, db)  # Bind Flask-Migrate to the app and SQLAlchemy
+    audio_store.init_app(app)
+    template_cache.init_app(app)
+    commands.register_commands(app)
     from views import views
 
     # Register Blueprints
@@ -0,0 +1,46 @@
+"""Malformed /sync items are reported on their own instead of failing the whole batch."""
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test import create_app  # noqa: E402
+from models import db, Recording  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+        'AUDIO_STORE_PATH': str(tmp_path / 'audio'),
+        'TEMPLATE_CACHE_DIR': None,
+    })
+    with app.app_context():
+        db.create_all()
+    yield app.test_client()
+    with app.app_context():
+        db.engine.dispose()
+
+
+def _item(**fields):
+    return dict({'client_uuid': str(uuid.uuid4()),
+                 'recording': {'patient_id': 1, 'recording_type': 'daily', 'hospitalization_day': 1}}, **fields)
+
+
+@pytest.mark.parametrize('malformed, field', [
+    ({'uploads': {'voice_sample': 123}}, 'voice_sample'),
+    ({'uploads': ['voice_sample']}, 'uploads'),
+    ({'recording': ['patient_id', 1]}, 'recording'),
+])
+def test_malformed_item_is_invalid_on_its_own(client, malformed, field):
+    good, bad = _item(), _item(**malformed)
+    response = client.post('/sync', json={'items': [bad, good]})
+    assert response.status_code == 200
+    invalid, created = response.get_json()['results']
+    assert invalid['status'] == 'invalid' and field in invalid['errors']
+    assert created['status'] == 'created'
+    with client.application.app_context():
+        assert db.session.scalar(db.select(db.func.count(Recording.id))) == 1
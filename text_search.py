@@ -0,0 +1,64 @@
+"""Full-text search over the free-text fields (diagnosis, medication, notes, ...).
+
+The observation_fts FTS5 index holds one row per text observation and is kept
+current by triggers on the observation table (models.text_search_ddl()). A
+search is one ranked MATCH on that index, joined to the matching recordings,
+instead of a ``LIKE '%...%'`` scan over every observation.
+"""
+import re
+
+from markupsafe import Markup, escape
+
+from models import Recording, db, observation_fts
+
+PER_PAGE = 20
+SNIPPET_TOKENS = 12
+
+# Snippet markers that cannot occur in form input; swapped for <mark> after escaping the text
+_HIGHLIGHT_START, _HIGHLIGHT_END = '\x02', '\x03'
+
+
+def match_query(text):
+    """An FTS5 query for what the user typed: every word must occur, each as a prefix.
+
+    Words are quoted, so punctuation such as the slash in "sacubitril/valsartan"
+    is not read as query syntax; within a quoted word it splits the word into a phrase.
+    """
+    words = re.findall(r'\S+', text)
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def _highlight(snippet):
+    return Markup(str(escape(snippet)).replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>'))
+
+
+def search_notes(text, page=1, per_page=PER_PAGE):
+    """Return ``(hits, has_next)`` for one page of hits on ``text``, best matches first.
+
+    Each hit has the recording's ``recording_id``, ``patient_id``,
+    ``recording_type`` and ``date``, the ``field`` that matched and an HTML-safe
+    ``snippet`` with the matching words in ``<mark>``.
+    """
+    query = match_query(text)
+    if not query:
+        return [], False
+    fts = observation_fts
+    rows = db.session.execute(
+        db.select(
+            fts.c.recording_id,
+            fts.c.code,
+            db.func.snippet(db.literal_column('observation_fts'), 0, _HIGHLIGHT_START, _HIGHLIGHT_END, '…',
+                            SNIPPET_TOKENS).label('snippet'),
+            Recording.patient_id,
+            Recording.recording_type,
+            Recording.date,
+        ).join(Recording, Recording.id == fts.c.recording_id)
+        .where(db.literal_column('observation_fts').op('MATCH')(query))
+        .order_by(fts.c.rank, fts.c.rowid)
+        .limit(per_page + 1).offset((page - 1) * per_page)
+    ).all()
+    hits = [{
+        'recording_id': row.recording_id, 'patient_id': row.patient_id, 'recording_type': row.recording_type,
+        'date': row.date, 'field': row.code, 'snippet': _highlight(row.snippet),
+    } for row in rows[:per_page]]
+    return hits, len(rows) > per_page
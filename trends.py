@@ -0,0 +1,71 @@
+"""Per-patient time series of the measurements in the recording_observation view.
+
+Long stays produce hundreds of observations per metric, far more than a chart
+can show. The series are therefore cut into at most ``points`` buckets of
+consecutive observations and each bucket is averaged, in SQL, together with
+the first and last raw value of every metric, all in one query.
+"""
+from models import OBSERVATION_METRICS, Recording, db, recording_observation
+
+METRICS = [metric for metric, _ in OBSERVATION_METRICS]
+DEFAULT_POINTS = 60
+MAX_POINTS = 500
+
+
+def patient_trends(patient_id, metrics=METRICS, points=DEFAULT_POINTS):
+    """Return ``{metric: {'count', 'first', 'last', 'change', 'series'}}`` for the metrics the patient has.
+
+    ``change`` is last minus first, e.g. the weight change since admission.
+    ``series`` holds one ``{'day', 'date', 'value', 'min', 'max', 'n'}`` entry
+    per bucket, ``value`` being the bucket mean. ``day`` is the hospitalization
+    day, counted from the first recording where the form did not record it.
+    """
+    obs = recording_observation
+    first_date = db.select(db.func.min(Recording.date)).where(Recording.patient_id == patient_id).scalar_subquery()
+    chronological = (obs.c.date, obs.c.recording_id)
+    by_metric = {'partition_by': obs.c.metric, 'order_by': chronological}
+    ordered = db.select(
+        obs.c.metric,
+        obs.c.date,
+        obs.c.value,
+        db.func.coalesce(
+            obs.c.hospitalization_day,
+            db.cast(db.func.julianday(db.func.date(obs.c.date)) - db.func.julianday(db.func.date(first_date)),
+                    db.Integer) + 1
+        ).label('day'),
+        (db.func.row_number().over(**by_metric) - 1).label('position'),
+        db.func.count().over(partition_by=obs.c.metric).label('total'),
+        db.func.first_value(obs.c.value).over(**by_metric).label('first'),
+        db.func.first_value(obs.c.value).over(
+            partition_by=obs.c.metric, order_by=[column.desc() for column in chronological]).label('last'),
+    ).where(obs.c.patient_id == patient_id, obs.c.metric.in_(metrics)).subquery()
+
+    bucket = (ordered.c.position * points // ordered.c.total).label('bucket')
+    rows = db.session.execute(
+        db.select(
+            ordered.c.metric,
+            db.func.min(ordered.c.day).label('day'),
+            db.func.min(ordered.c.date).label('date'),
+            db.func.avg(ordered.c.value).label('value'),
+            db.func.min(ordered.c.value).label('min'),
+            db.func.max(ordered.c.value).label('max'),
+            db.func.count().label('n'),
+            db.func.max(ordered.c.total).label('total'),
+            db.func.max(ordered.c.first).label('first'),
+            db.func.max(ordered.c.last).label('last'),
+        ).group_by(ordered.c.metric, bucket).order_by(ordered.c.metric, bucket)
+    )
+
+    trends = {}
+    for row in rows:
+        trend = trends.get(row.metric)
+        if trend is None:
+            trend = trends[row.metric] = {
+                'count': row.total, 'first': row.first, 'last': row.last,
+                'change': round(row.last - row.first, 2), 'series': [],
+            }
+        trend['series'].append({
+            'day': row.day, 'date': row.date.isoformat(), 'value': round(row.value, 2),
+            'min': row.min, 'max': row.max, 'n': row.n,
+        })
+    return {metric: trends[metric] for metric in metrics if metric in trends}
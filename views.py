@@ -1,10 +1,47 @@
-from flask import Blueprint, render_template, request, redirect, url_for
-from models import Recording, db, Patient
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, abort, current_app, send_file
+from models import (AUDIO_KINDS, OBSERVATION_KINDS, AudioJob, Observation, Recording, RecordingAudio, db,
+                    decode_observation, derive_columns, split_observations, Patient)
+from audio_store import AudioTooLarge, FileSystemAudioStore, UploadNotFound, UploadOffsetMismatch, get_store
+from markupsafe import Markup
+from kccq import QUESTIONS as KCCQ_QUESTIONS
+from recording_schema import DATE_FIELD, RECORDING_FIELDS, ValidationError, parse_recording
+import analytics
+import template_cache
+import text_search
+import trends
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import json
+import uuid
 
 # Create a Blueprint
 views = Blueprint('views', __name__)
 
+DASHBOARD_TABS = ('all', 'complete', 'incomplete')
+
+# Largest batch /sync accepts; the client sends smaller ones
+SYNC_MAX_ITEMS = 100
+
+# Fields rendered by the dashboard patient cards
+DASHBOARD_FIELDS = [
+    "id", "patient_id", "recording_type", "hospitalization_day", "weight",
+    "ntprobnp", "ntprobnp_daily", "kalium", "kalium_daily", "natrium", "natrium_daily",
+    "kreatinin_gfr", "kreatinin_gfr_daily", "harnstoff", "harnstoff_daily", "hb", "hb_daily",
+    "initial_weight", "initial_bp", "pulse", "medication_changes", "current_weight",
+    "discharge_medication", "admission_date", "discharge_date",
+    "kccq_clinical_summary", "kccq_overall_summary",
+]
+
+# Headings of the free-text fields in the search results, as on the recording form
+TEXT_FIELD_LABELS = {
+    'diagnosis': 'Diagnose / Grunderkrankung',
+    'medication': 'Aktuelle Medikation',
+    'comorbidities': 'Begleiterkrankungen',
+    'medication_changes': 'Medikamentenanpassungen',
+    'discharge_medication': 'Medikation bei Entlassung',
+    'abschluss_labor': 'Abschlusslabor',
+}
+
 # Define routes
 @views.route('/')
 def home():
@@ -12,163 +49,526 @@ def home():
 
 @views.route('/dashboards')
 def dashboards():
-    patients = Patient.query.all()
-    recordings = Recording.query.all()
-    recordings_by_patient = {}
-    complete_records_by_patient = {}
-    incomplete_records_by_patient = {}
-
-    required_fields_by_type = {
-        "admission": [
-            "recording_type", "hospitalization_day", "age", "gender", "height", "diagnosis", "medication", "comorbidities",
-            "admission_date", "ntprobnp", "kalium", "natrium", "kreatinin_gfr", "harnstoff", "hb",
-            "initial_weight", "initial_bp", "voice_sample",
-            # KCCQ-Fragen
-            "kccq1a", "kccq1b", "kccq1c", "kccq1d", "kccq1e", "kccq1f",
-            "kccq2", "kccq3", "kccq4", "kccq5", "kccq6", "kccq7", "kccq8", "kccq9", "kccq10", "kccq11",
-            "kccq12", "kccq13", "kccq14", "kccq15a", "kccq15b", "kccq15c", "kccq15d", "kccq16"
-        ],
-        "daily": [
-            "recording_type", "hospitalization_day", "weight", "bp", "pulse", "voice_sample",
-            "medication_changes", "kalium_daily", "natrium_daily", "kreatinin_gfr_daily", "harnstoff_daily", "hb_daily", "ntprobnp_daily"
-        ],
-        "discharge": [
-            "recording_type", "hospitalization_day", "ntprobnp", "kalium", "natrium", "kreatinin_gfr", "harnstoff", "hb",
-            "current_weight", "discharge_medication", "discharge_date", "voice_sample",
-            # KCCQ-Fragen (ggf. mit anderem Prefix, falls du sie für Discharge separat speicherst)
-            "kccq1a", "kccq1b", "kccq1c", "kccq1d", "kccq1e", "kccq1f",
-            "kccq2", "kccq3", "kccq4", "kccq5", "kccq6", "kccq7", "kccq8", "kccq9", "kccq10", "kccq11",
-            "kccq12", "kccq13", "kccq14", "kccq15a", "kccq15b", "kccq15c", "kccq15d", "kccq16"
-        ]
-    }
-
-    for recording in recordings:
-        rec_type = (recording.recording_type or "").lower()
-        required_fields = required_fields_by_type.get(rec_type, ["recording_type", "hospitalization_day", "voice_sample"])
-        is_complete = True
-        for field in required_fields:
-            value = getattr(recording, field, None)
-            if value in (None, '', 0):
-                is_complete = False
-                break
-
-        recordings_by_patient.setdefault(recording.patient_id, []).append(recording)
-        if is_complete:
-            complete_records_by_patient.setdefault(recording.patient_id, []).append(recording)
-        else:
-            incomplete_records_by_patient.setdefault(recording.patient_id, []).append(recording)
-
+    patient_ids, next_cursor = _patient_page('all', None, _page_size())
     return render_template(
         'dashboards.html',
-        patients=patients,
-        recordings_by_patient=recordings_by_patient,
-        complete_records_by_patient=complete_records_by_patient,
-        incomplete_records_by_patient=incomplete_records_by_patient
+        patient_ids=patient_ids,
+        cards=_patient_cards('all', patient_ids),
+        next_cursor=next_cursor
     )
 
+@views.route('/dashboards/patients')
+def dashboard_patients():
+    tab = _dashboard_tab()
+    patient_ids, next_cursor = _patient_page(tab, request.args.get('after', type=int), _page_size())
+    return render_template(
+        '_patient_cards.html',
+        tab=tab,
+        patient_ids=patient_ids,
+        cards=_patient_cards(tab, patient_ids),
+        next_cursor=next_cursor
+    )
+
+@views.route('/dashboards/patients/<int:patient_id>')
+def dashboard_patient_card(patient_id):
+    tab = _dashboard_tab()
+    Patient.query.get_or_404(patient_id)
+    return _patient_cards(tab, [patient_id])[patient_id]
+
+@views.route('/api/patients')
+def api_patients():
+    tab = _dashboard_tab()
+    patient_ids, next_cursor = _patient_page(tab, request.args.get('after', type=int), _page_size())
+    counts = {
+        patient_id: (total, complete or 0)
+        for patient_id, total, complete in db.session.query(
+            Recording.patient_id, db.func.count(Recording.id), db.func.sum(db.cast(Recording.is_complete, db.Integer))
+        ).filter(Recording.patient_id.in_(patient_ids)).group_by(Recording.patient_id)
+    }
+    clip_counts = _clip_counts(patient_ids)
+    patients = []
+    for patient_id in patient_ids:
+        total, complete = counts.get(patient_id, (0, 0))
+        patients.append({'id': patient_id, 'recordings': total, 'complete': complete, 'incomplete': total - complete,
+                         'clips': clip_counts.get(patient_id, {})})
+    return jsonify(patients=patients, next_cursor=next_cursor)
+
+@views.route('/api/patients/<int:patient_id>/recordings')
+def api_patient_recordings(patient_id):
+    tab = _dashboard_tab()
+    Patient.query.get_or_404(patient_id)
+    records = _recordings_by_patient(tab, [patient_id]).get(patient_id, [])
+    return jsonify(recordings=[
+        {field: _json_value(record[field]) for field in DASHBOARD_FIELDS + ['is_complete']}
+        for record in records
+    ])
+
+@views.route('/api/analytics')
+def cohort_analytics():
+    return jsonify(analytics.cohort_analytics())
+
+@views.route('/patient/<int:patient_id>/trends')
+def patient_trends(patient_id):
+    Patient.query.get_or_404(patient_id)
+    metrics = request.args.get('metrics')
+    metrics = metrics.split(',') if metrics else trends.METRICS
+    unknown = set(metrics) - set(trends.METRICS)
+    if unknown:
+        abort(400, f"Unknown metric(s): {', '.join(sorted(unknown))}")
+    points = max(1, min(request.args.get('points', trends.DEFAULT_POINTS, type=int), trends.MAX_POINTS))
+    return jsonify(patient_id=patient_id, points=points,
+                   metrics=trends.patient_trends(patient_id, metrics, points))
+
+def _dashboard_tab():
+    tab = request.args.get('tab', 'all')
+    if tab not in DASHBOARD_TABS:
+        abort(404)
+    return tab
+
+def _page_size():
+    limit = request.args.get('limit', type=int) or current_app.config.get('DASHBOARD_PAGE_SIZE', 30)
+    return max(1, min(limit, 200))
+
+def _patient_page(tab, after, limit):
+    """One page of patient IDs for a dashboard tab, using the last seen ID as cursor."""
+    query = db.session.query(Patient.id)
+    if tab != 'all':
+        query = query.filter(db.exists().where(
+            Recording.patient_id == Patient.id,
+            Recording.is_complete.is_(tab == 'complete')
+        ))
+    if after is not None:
+        query = query.filter(Patient.id > after)
+    patient_ids = [row.id for row in query.order_by(Patient.id).limit(limit + 1)]
+    next_cursor = patient_ids[limit - 1] if len(patient_ids) > limit else None
+    return patient_ids[:limit], next_cursor
+
+def _recordings_by_patient(tab, patient_ids):
+    if not patient_ids:
+        return {}
+    columns = [getattr(Recording, field)
+               for field in DASHBOARD_FIELDS + ['is_complete'] if field not in OBSERVATION_KINDS]
+    codes = [field for field in DASHBOARD_FIELDS if field in OBSERVATION_KINDS]
+    query = db.select(*columns).where(Recording.patient_id.in_(patient_ids))
+    if tab != 'all':
+        query = query.where(Recording.is_complete.is_(tab == 'complete'))
+
+    recordings_by_patient = {}
+    for recording in _recording_rows(query.order_by(Recording.patient_id, Recording.id), codes):
+        recordings_by_patient.setdefault(recording['patient_id'], []).append(recording)
+    return recordings_by_patient
+
+def _recording_rows(query, codes):
+    """Dicts of the Recording columns ``query`` selects (``id`` among them) and the observations ``codes``.
+
+    Plain rows rather than Recording instances: loading only some observations into
+    an instance would leave its observations collection incomplete for the rest of the session.
+    """
+    rows = [dict(row, **dict.fromkeys(codes)) for row in db.session.execute(query).mappings()]
+    by_id = {row['id']: row for row in rows}
+    if by_id and codes:
+        observations = db.session.execute(
+            db.select(Observation.recording_id, Observation.code, Observation.value).where(
+                Observation.recording_id.in_(query.with_only_columns(Recording.id).order_by(None)),
+                Observation.code.in_(codes))
+        )
+        for recording_id, code, value in observations:
+            by_id[recording_id][code] = decode_observation(code, value)
+    return rows
+
+def _patient_cards(tab, patient_ids):
+    """Rendered card of each patient, from the card cache unless the patient's recordings changed."""
+    def render(patient_ids):
+        records_by_patient = _recordings_by_patient(tab, patient_ids)
+        clip_counts = _clip_counts(patient_ids)
+        return {
+            patient_id: Markup(render_template(
+                '_patient_card.html', tab=tab, patient_id=patient_id,
+                records=records_by_patient.get(patient_id, []), clips=clip_counts.get(patient_id, {})))
+            for patient_id in patient_ids
+        }
+    return template_cache.patient_cards(tab, patient_ids, render)
+
+def _clip_counts(patient_ids):
+    """Number of audio clips per kind for each patient, in one aggregate query."""
+    if not patient_ids:
+        return {}
+    rows = db.session.query(Recording.patient_id, RecordingAudio.kind, db.func.count(RecordingAudio.id)).join(
+        RecordingAudio, RecordingAudio.recording_id == Recording.id
+    ).filter(Recording.patient_id.in_(patient_ids)).group_by(Recording.patient_id, RecordingAudio.kind)
+    clip_counts = {}
+    for patient_id, kind, count in rows:
+        clip_counts.setdefault(patient_id, {})[kind] = count
+    return clip_counts
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
 @views.route('/recording', methods=['GET', 'POST'])
 def recording():
     if request.method == 'POST':
-        patient_id = request.form.get('patient_id')
-        patient = Patient.query.filter_by(id=patient_id).first()
-        if not patient:
-            new_patient = Patient(id=patient_id)
-            db.session.add(new_patient)
-            db.session.commit()
-
-        # Voice sample
-        voice_file = request.files.get('voice_sample')
-        voice_sample = voice_file.read() if voice_file else None
-
-        # Build the Recording object with all possible fields
-        recording = Recording(
-            patient_id=patient_id,
-            recording_type=request.form.get('recording_type'),
-            hospitalization_day=request.form.get('hospitalization_day'),
-
-            # Admission fields
-            age=request.form.get('age') or None,
-            gender=request.form.get('gender') or None,
-            height=request.form.get('height') or None,
-            diagnosis=request.form.get('diagnosis') or None,
-            medication=request.form.get('medication') or None,
-            comorbidities=request.form.get('comorbidities') or None,
-            admission_date=request.form.get('admission_date') or None,
-            ntprobnp=request.form.get('ntprobnp') or None,
-            kalium=request.form.get('kalium') or None,
-            natrium=request.form.get('natrium') or None,
-            kreatinin_gfr=request.form.get('kreatinin_gfr') or None,
-            harnstoff=request.form.get('harnstoff') or None,
-            hb=request.form.get('hb') or None,
-            initial_weight=request.form.get('initial_weight') or None,
-            initial_bp=request.form.get('initial_bp') or None,
-
-            # KCCQ Einzelitems
-            kccq1a=request.form.get('kccq1a') or None,
-            kccq1b=request.form.get('kccq1b') or None,
-            kccq1c=request.form.get('kccq1c') or None,
-            kccq1d=request.form.get('kccq1d') or None,
-            kccq1e=request.form.get('kccq1e') or None,
-            kccq1f=request.form.get('kccq1f') or None,
-            kccq2=request.form.get('kccq2') or None,
-            kccq3=request.form.get('kccq3') or None,
-            kccq4=request.form.get('kccq4') or None,
-            kccq5=request.form.get('kccq5') or None,
-            kccq6=request.form.get('kccq6') or None,
-            kccq7=request.form.get('kccq7') or None,
-            kccq8=request.form.get('kccq8') or None,
-            kccq9=request.form.get('kccq9') or None,
-            kccq10=request.form.get('kccq10') or None,
-            kccq11=request.form.get('kccq11') or None,
-            kccq12=request.form.get('kccq12') or None,
-            kccq13=request.form.get('kccq13') or None,
-            kccq14=request.form.get('kccq14') or None,
-            kccq15a=request.form.get('kccq15a') or None,
-            kccq15b=request.form.get('kccq15b') or None,
-            kccq15c=request.form.get('kccq15c') or None,
-            kccq15d=request.form.get('kccq15d') or None,
-            kccq16=request.form.get('kccq16') or None,
-
-            # Daily fields
-            weight=request.form.get('weight') or None,
-            bp=request.form.get('bp') or None,
-            pulse=request.form.get('pulse') or None,
-            medication_changes=request.form.get('medication_changes') or None,
-            kalium_daily=request.form.get('kalium_daily') or None,
-            natrium_daily=request.form.get('natrium_daily') or None,
-            kreatinin_gfr_daily=request.form.get('kreatinin_gfr_daily') or None,
-            harnstoff_daily=request.form.get('harnstoff_daily') or None,
-            hb_daily=request.form.get('hb_daily') or None,
-            ntprobnp_daily=request.form.get('ntprobnp_daily') or None,
-
-            # Discharge fields
-            abschluss_labor=request.form.get('abschluss_labor') or None,
-            current_weight=request.form.get('current_weight') or None,
-            discharge_medication=request.form.get('discharge_medication') or None,
-            discharge_date=request.form.get('discharge_date') or None,
-
-            # Voice sample
-            voice_sample=voice_sample,
-
-            # Date of recording
-            date=datetime.datetime.now()
-        )
+        try:
+            values = parse_recording(request.form)
+        except ValidationError as e:
+            return _recording_form(request.form.get('patient_id'), errors=e.errors), 400
+
+        try:
+            audios = _ingest_audio_uploads()
+        except AudioTooLarge:
+            abort(413)
+
+        # Patient and recording are written in one transaction
+        _add_missing_patients({values['patient_id']})
+        recording = Recording(**values, audios=audios, date=datetime.datetime.now())
 
         db.session.add(recording)
+        # Queued in the same transaction; `flask process-audio` picks the jobs up once committed
+        db.session.add_all([AudioJob(audio=audio) for audio in audios])
+        analytics.refresh_patients({values['patient_id']})
         db.session.commit()
+        analytics.invalidate()
+        template_cache.invalidate({values['patient_id']})
+        store = get_store()
+        for kind in AUDIO_KINDS:
+            if request.form.get(f'{kind}_upload'):
+                store.discard_upload(request.form[f'{kind}_upload'])
         return redirect(url_for('views.dashboards'))
 
-    # GET request
-    patient_id = request.args.get('patient_id')
+    return _recording_form(request.args.get('patient_id'))
+
+def _recording_form(patient_id, errors=None):
     last_recording = None
     hospitalization_day = ''
     if patient_id:
-        recordings = Recording.query.filter_by(patient_id=patient_id).order_by(Recording.date).all()
-        if recordings:
-            first_recording = recordings[0]
-            last_recording = recordings[-1]
-            hospitalization_day = (datetime.datetime.now().date() - first_recording.date.date()).days
-    return render_template('recording.html', last_recording=last_recording, hospitalization_day=hospitalization_day, patient_id=patient_id)
+        # Two index lookups on (patient_id, date), however long the stay has been
+        last_recording = Recording.query.filter_by(patient_id=patient_id).order_by(Recording.date.desc()).first()
+        if last_recording:
+            first_date = db.session.scalar(
+                db.select(db.func.min(Recording.date)).where(Recording.patient_id == patient_id))
+            hospitalization_day = (datetime.datetime.now().date() - first_date.date()).days
+    return render_template('recording.html', last_recording=last_recording, hospitalization_day=hospitalization_day, patient_id=patient_id, audio_kinds=AUDIO_KINDS, kccq_questions=KCCQ_QUESTIONS, errors=errors)
+
+def _add_missing_patients(patient_ids):
+    existing = set(db.session.scalars(db.select(Patient.id).where(Patient.id.in_(patient_ids))))
+    missing = sorted(set(patient_ids) - existing)
+    if missing:
+        db.session.execute(db.insert(Patient), [{'id': patient_id} for patient_id in missing])
+
+@views.route('/api/recordings/bulk', methods=['POST'])
+def bulk_recordings():
+    """Import many recordings at once from a JSON array (or ``{"recordings": [...]}``) or NDJSON.
+
+    Every item is validated first; if any is invalid nothing is stored and the
+    errors are returned per item index. Valid batches are inserted with one
+    executemany in a single transaction. Items carry no audio.
+    """
+    items = _bulk_items()
+    fields = RECORDING_FIELDS + [DATE_FIELD]
+    now = datetime.datetime.now()
+    rows = []
+    errors = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[index] = {'': 'must be an object'}
+            continue
+        try:
+            row = parse_recording(item, fields)
+        except ValidationError as e:
+            errors[index] = e.errors
+            continue
+        row['date'] = row['date'] or now
+        rows.append(row)
+    if errors:
+        return jsonify(errors=errors), 400
+    if not rows:
+        return jsonify(inserted=0, ids=[]), 200
+
+    _add_missing_patients({row['patient_id'] for row in rows})
+    rows = derive_columns(rows)
+    observations = [split_observations(row) for row in rows]
+    ids = list(db.session.scalars(db.insert(Recording).returning(Recording.id, sort_by_parameter_order=True),
+                                  rows))
+    observation_rows = [dict(observation, recording_id=recording_id)
+                        for recording_id, values in zip(ids, observations) for observation in values]
+    if observation_rows:
+        db.session.execute(db.insert(Observation), observation_rows)
+    patient_ids = {row['patient_id'] for row in rows}
+    analytics.refresh_patients(patient_ids)
+    db.session.commit()
+    analytics.invalidate()
+    template_cache.invalidate(patient_ids)
+    return jsonify(inserted=len(ids), ids=ids), 201
+
+def _bulk_items():
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        items = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    abort(400, f'Line {number} is not valid JSON')
+        return items
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('recordings')
+    if not isinstance(payload, list):
+        abort(400, 'Expected a JSON array of recordings or NDJSON')
+    return payload
+
+def _ingest_audio_uploads():
+    """Collect every clip of the form and return unsaved RecordingAudio rows.
+
+    A clip either references a finished resumable upload (``<kind>_upload``) or
+    comes as a file in the form; files are streamed into the audio store in parallel.
+    """
+    store = get_store()
+    audios = []
+    uploads = {}
+    for kind in AUDIO_KINDS:
+        upload_id = request.form.get(f'{kind}_upload')
+        if upload_id:
+            try:
+                audio = _uploaded_audio(store, kind, upload_id)
+            except ValueError as e:
+                abort(400, str(e))
+            if audio:
+                audios.append(audio)
+            continue
+        upload = next((f for f in request.files.getlist(kind) if f and f.filename), None)
+        if upload:
+            uploads[kind] = upload
+    if not uploads:
+        return audios
+
+    max_size = current_app.config['AUDIO_MAX_BYTES']
+    with ThreadPoolExecutor(max_workers=len(uploads)) as executor:
+        futures = {kind: executor.submit(store.put_stream, upload.stream, max_size) for kind, upload in uploads.items()}
+    for kind, future in futures.items():
+        digest, size = future.result()
+        if size:
+            audios.append(RecordingAudio(
+                kind=kind, sha256=digest, size=size,
+                mime=uploads[kind].mimetype or 'application/octet-stream'
+            ))
+    return audios
+
+def _uploaded_audio(store, kind, upload_id):
+    """Unsaved RecordingAudio for a finished upload, None for an empty one; ValueError if unusable."""
+    try:
+        info = store.upload_info(upload_id)
+    except UploadNotFound:
+        raise ValueError(f'Unknown upload for {kind}')
+    if not info['complete'] or info.get('kind') != kind:
+        raise ValueError(f'Upload for {kind} is not complete')
+    if not info['size']:
+        return None
+    return RecordingAudio(kind=kind, sha256=info['sha256'], size=info['size'], mime=info['mime'])
+
+# Resumable clip uploads: the recorder streams chunks while recording, the form
+# then only sends the upload id (see _ingest_audio_uploads)
+@views.route('/uploads', methods=['POST'])
+def create_upload():
+    payload = request.get_json(silent=True) or request.form
+    kind = payload.get('kind')
+    mime = payload.get('mime') or 'audio/webm'
+    # JSON may carry any type; only strings are names of a kind or mime type
+    if not isinstance(kind, str) or not isinstance(mime, str):
+        abort(400)
+    if kind not in AUDIO_KINDS or not mime.startswith('audio/'):
+        abort(400)
+    upload_id = get_store().create_upload(kind=kind, mime=mime)
+    return jsonify(upload_id=upload_id, offset=0), 201
+
+@views.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    try:
+        info = get_store().upload_info(upload_id)
+    except UploadNotFound:
+        abort(404)
+    return jsonify(info)
+
+@views.route('/uploads/<upload_id>', methods=['PATCH'])
+def append_upload(upload_id):
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None or offset < 0:
+        abort(400)
+    try:
+        offset = get_store().append_upload(upload_id, offset, request.stream, current_app.config['AUDIO_MAX_BYTES'])
+    except UploadNotFound:
+        abort(404)
+    except UploadOffsetMismatch as e:
+        return jsonify(upload_id=upload_id, offset=e.offset), 409
+    except AudioTooLarge:
+        abort(413)
+    return jsonify(upload_id=upload_id, offset=offset)
+
+@views.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    try:
+        digest, size = get_store().complete_upload(upload_id)
+    except UploadNotFound:
+        abort(404)
+    return jsonify(upload_id=upload_id, sha256=digest, size=size, complete=True)
+
+# Offline capture: the recording page queues forms and clips in IndexedDB
+# (static/capture.js) and sends them here in batches once it is back online
+@views.route('/sync', methods=['POST'])
+def sync():
+    """Store a batch of queued recordings; each item reports its own status.
+
+    Items are ``{"client_uuid", "recording": {...}, "uploads": {kind: upload_id}}``.
+    Status is ``created`` or ``duplicate`` (both with the recording ``id``; the
+    client can drop the item), ``invalid`` (with ``errors``; retrying will not
+    help) or ``upload_missing`` (upload the clips again, then retry). All
+    created items are committed together, and a client UUID that is already
+    stored is never stored again, so a batch can be resent safely.
+    """
+    payload = request.get_json(silent=True)
+    items = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        abort(400, 'Expected {"items": [...]}')
+    if len(items) > SYNC_MAX_ITEMS:
+        abort(413, f'At most {SYNC_MAX_ITEMS} items per batch')
+
+    client_uuids = [_client_uuid(item.get('client_uuid')) for item in items if isinstance(item, dict)]
+    stored = dict(db.session.execute(
+        db.select(Recording.client_uuid, Recording.id).where(Recording.client_uuid.in_(
+            [client_uuid for client_uuid in client_uuids if client_uuid]))
+    ).all())
+
+    store = get_store()
+    fields = RECORDING_FIELDS + [DATE_FIELD]
+    results = []
+    created = []
+    for item in items:
+        result = _sync_item(item, stored, store, fields)
+        results.append(result)
+        if result['status'] == 'created':
+            created.append((result, result.pop('recording'), item.get('uploads') or {}))
+            stored[result['client_uuid']] = None
+
+    if created:
+        _add_missing_patients({recording.patient_id for _, recording, _ in created})
+        for _, recording, _ in created:
+            db.session.add(recording)
+            db.session.add_all([AudioJob(audio=audio) for audio in recording.audios])
+        analytics.refresh_patients({recording.patient_id for _, recording, _ in created})
+        db.session.commit()
+        analytics.invalidate()
+        template_cache.invalidate({recording.patient_id for _, recording, _ in created})
+        for result, recording, uploads in created:
+            result['id'] = stored[recording.client_uuid] = recording.id
+            for upload_id in uploads.values():
+                store.discard_upload(upload_id)
+        for result in results:
+            if result['status'] == 'duplicate':
+                result['id'] = stored[result['client_uuid']]
+    return jsonify(results=results)
+
+def _sync_item(item, stored, store, fields):
+    if not isinstance(item, dict):
+        return {'client_uuid': None, 'status': 'invalid', 'errors': {'': 'must be an object'}}
+    client_uuid = _client_uuid(item.get('client_uuid'))
+    if client_uuid is None:
+        return {'client_uuid': item.get('client_uuid'), 'status': 'invalid',
+                'errors': {'client_uuid': 'must be a UUID'}}
+    if client_uuid in stored:
+        # Stored by an earlier attempt (or earlier in this batch) whose response never arrived
+        return {'client_uuid': client_uuid, 'status': 'duplicate', 'id': stored[client_uuid]}
+
+    # Shapes first, so a malformed item is reported on its own instead of failing the batch
+    data = item.get('recording') or {}
+    uploads = item.get('uploads') or {}
+    if not isinstance(data, dict):
+        return {'client_uuid': client_uuid, 'status': 'invalid', 'errors': {'recording': 'must be an object'}}
+    if not isinstance(uploads, dict):
+        return {'client_uuid': client_uuid, 'status': 'invalid', 'errors': {'uploads': 'must be an object'}}
+    for kind, upload_id in uploads.items():
+        if kind not in AUDIO_KINDS:
+            return {'client_uuid': client_uuid, 'status': 'invalid', 'errors': {kind: 'unknown clip kind'}}
+        if not isinstance(upload_id, str):
+            return {'client_uuid': client_uuid, 'status': 'invalid', 'errors': {kind: 'must be an upload id'}}
+
+    try:
+        values = parse_recording(data, fields)
+    except ValidationError as e:
+        return {'client_uuid': client_uuid, 'status': 'invalid', 'errors': e.errors}
+    audios = []
+    for kind, upload_id in uploads.items():
+        try:
+            audio = _uploaded_audio(store, kind, upload_id)
+        except ValueError as e:
+            return {'client_uuid': client_uuid, 'status': 'upload_missing', 'errors': {kind: str(e)}}
+        if audio:
+            audios.append(audio)
+
+    values['date'] = values['date'] or datetime.datetime.now()
+    recording = Recording(**values, audios=audios, client_uuid=client_uuid)
+    return {'client_uuid': client_uuid, 'status': 'created', 'recording': recording}
+
+def _client_uuid(value):
+    try:
+        return str(uuid.UUID(value))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+@views.route('/sw.js')
+def service_worker():
+    # Served from the root so the worker's scope covers /recording, not just /static
+    response = current_app.send_static_file('sw.js')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@views.route('/recording/<int:recording_id>/audio', defaults={'kind': 'voice_sample'})
+@views.route('/recording/<int:recording_id>/audio/<kind>')
+def recording_audio(recording_id, kind):
+    """Serve the clip's canonical rendition (or, with ``?original=1``, the bytes as uploaded if kept)."""
+    clip = RecordingAudio.query.join(Recording).filter(
+        RecordingAudio.recording_id == recording_id, RecordingAudio.kind == kind
+    ).with_entities(
+        RecordingAudio.sha256, RecordingAudio.mime, RecordingAudio.original_sha256, RecordingAudio.original_mime,
+        Recording.date
+    ).first_or_404()
+    digest, mime = clip.sha256, clip.mime
+    if request.args.get('original') and clip.original_sha256:
+        digest, mime = clip.original_sha256, clip.original_mime
+
+    # The digest names the content, so it doubles as a strong ETag.
+    # send_file answers Range and If-None-Match/If-Modified-Since requests itself.
+    store = get_store()
+    # A row whose blob is gone (lost or restored without the store) has nothing to serve
+    if not store.exists(digest):
+        abort(404)
+    if isinstance(store, FileSystemAudioStore):
+        source = store.path(digest)
+    else:
+        source = store.open(digest)
+    response = send_file(
+        source,
+        mimetype=mime or 'application/octet-stream',
+        conditional=True,
+        etag=digest,
+        last_modified=clip.date,
+        max_age=0
+    )
+    response.cache_control.private = True
+    return response
+
+@views.route('/recording/<int:recording_id>/audio/<kind>/peaks')
+def recording_audio_peaks(recording_id, kind):
+    """Cached waveform peaks of a clip, so players can draw it before (or without) loading the audio."""
+    clip = RecordingAudio.query.filter_by(recording_id=recording_id, kind=kind).with_entities(
+        RecordingAudio.sha256, RecordingAudio.duration, RecordingAudio.peaks
+    ).first_or_404()
+    if clip.peaks is None:
+        abort(404)
+    response = jsonify(duration=clip.duration, peaks=clip.peaks)
+    response.set_etag(clip.sha256)
+    response.cache_control.private = True
+    return response.make_conditional(request)
 
 @views.route('/search', methods=['GET'])
 def search():
@@ -179,23 +579,34 @@ def search():
     if query.isdigit():  # Ensure the query is numeric
         patient = Patient.query.filter_by(id=int(query)).first()  # Find the patient by ID
         if patient:
-            records = Recording.query.filter_by(patient_id=patient.id).order_by(Recording.hospitalization_day.asc()).all()
+            # Only what the table shows; the charts fetch downsampled series from patient_trends
+            records = _recording_rows(
+                db.select(Recording.id, Recording.recording_type, Recording.hospitalization_day,
+                          Recording.date, Recording.has_voice_sample)
+                .where(Recording.patient_id == patient.id).order_by(Recording.hospitalization_day.asc()),
+                ['weight'])
         else:
             records = []
+        return render_template('search.html', patient=patient, records=records, query=query)
 
-    return render_template('search.html', patient=patient, records=records, query=query)
+    # Anything else searches the free-text fields, ranked, one page at a time
+    page = max(1, request.args.get('page', 1, type=int))
+    hits, has_next = text_search.search_notes(query, page) if query else ([], False)
+    return render_template('search.html', patient=None, records=[], query=query, hits=hits, page=page,
+                           has_next=has_next, field_labels=TEXT_FIELD_LABELS)
 
 @views.route('/delete_recording/<int:recording_id>', methods=['POST'])
 def delete_recording(recording_id):
-    recording = Recording.query.get_or_404(recording_id)
-    patient_id = recording.patient_id
-    db.session.delete(recording)
+    # One transaction: ON DELETE CASCADE removes the clips, jobs and voice features,
+    # and the patient goes too once no recording is left
+    patient_id = db.session.scalar(
+        db.delete(Recording).where(Recording.id == recording_id).returning(Recording.patient_id))
+    if patient_id is None:
+        abort(404)
+    db.session.execute(db.delete(Patient).where(
+        Patient.id == patient_id, ~db.exists().where(Recording.patient_id == patient_id)))
+    analytics.refresh_patients({patient_id})
     db.session.commit()
-    # Prüfe, ob der Patient noch weitere Recordings hat
-    remaining = Recording.query.filter_by(patient_id=patient_id).count()
-    if remaining == 0:
-        patient = Patient.query.get(patient_id)
-        if patient:
-            db.session.delete(patient)
-            db.session.commit()
-    return redirect(request.referrer or url_for('views.dashboards'))
\ No newline at end of file
+    analytics.invalidate()
+    template_cache.invalidate({patient_id})
+    return redirect(request.referrer or url_for('views.dashboards'))
@@ -0,0 +1,141 @@
+"""Voice biomarker extraction for stored audio clips.
+
+Everything here is a plain function, so it can run in a worker process without
+an app context; audio_ingest.process_clip decodes each clip once and passes the
+samples to compute_features. Decoding WebM/Opus or MP4/AAC needs ffmpeg on the
+PATH; PCM WAV files are read directly.
+"""
+import subprocess
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+F0_MIN = 60.0
+F0_MAX = 400.0
+N_MFCC = 13
+N_MELS = 26
+
+
+def decode(path, sample_rate=SAMPLE_RATE):
+    """Decode an audio file to mono float32 samples in [-1, 1]. Returns ``(samples, sample_rate)``."""
+    with open(path, 'rb') as f:
+        is_wav = f.read(4) == b'RIFF'
+    if is_wav:
+        with wave.open(path, 'rb') as w:
+            if w.getsampwidth() == 2:
+                channels = w.getnchannels()
+                pcm = np.frombuffer(w.readframes(w.getnframes()), dtype='<i2').astype(np.float32) / 32768.0
+                return pcm.reshape(-1, channels).mean(axis=1), w.getframerate()
+
+    result = subprocess.run(
+        ['ffmpeg', '-nostdin', '-v', 'error', '-i', path, '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), '-'],
+        capture_output=True, check=True
+    )
+    return np.frombuffer(result.stdout, dtype='<f4'), sample_rate
+
+
+def _frames(samples, frame_length, hop_length):
+    if len(samples) < frame_length:
+        samples = np.pad(samples, (0, frame_length - len(samples)))
+    return np.lib.stride_tricks.sliding_window_view(samples, frame_length)[::hop_length]
+
+
+def _mel_filterbank(sample_rate, n_fft, n_mels):
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    mel_points = np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2.0), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+    fft_bins = np.arange(n_fft // 2 + 1)[None, :]
+    left, center, right = bins[:-2, None], bins[1:-1, None], bins[2:, None]
+    rising = (fft_bins - left) / np.maximum(center - left, 1)
+    falling = (right - fft_bins) / np.maximum(right - center, 1)
+    return np.clip(np.minimum(rising, falling), 0.0, None)
+
+
+def _dct_matrix(n_out, n_in):
+    k = np.arange(n_out)[:, None]
+    n = np.arange(n_in)[None, :]
+    basis = np.cos(np.pi * k * (2 * n + 1) / (2 * n_in)) * np.sqrt(2.0 / n_in)
+    basis[0] /= np.sqrt(2.0)
+    return basis
+
+
+def _pitch(frames, sample_rate):
+    """Autocorrelation pitch tracker over all frames at once. Returns per-frame F0 (Hz) and clarity."""
+    length = frames.shape[1]
+    centered = frames - frames.mean(axis=1, keepdims=True)
+    spectrum = np.fft.rfft(centered, n=2 * length, axis=1)
+    autocorr = np.fft.irfft(np.abs(spectrum) ** 2, axis=1)[:, :length]
+    energy = np.maximum(autocorr[:, :1], 1e-12)
+    autocorr = autocorr / energy
+
+    min_lag = int(sample_rate / F0_MAX)
+    max_lag = min(int(sample_rate / F0_MIN), length - 2)
+    window = autocorr[:, min_lag:max_lag + 1]
+    peak = np.argmax(window, axis=1)
+    lag = peak + min_lag
+    clarity = window[np.arange(len(window)), peak]
+
+    # Parabolic interpolation around the peak for sub-sample period resolution
+    rows = np.arange(len(autocorr))
+    prev_value = autocorr[rows, lag - 1]
+    next_value = autocorr[rows, lag + 1]
+    denominator = prev_value - 2 * clarity + next_value
+    offset = np.divide(0.5 * (prev_value - next_value), denominator,
+                       out=np.zeros_like(denominator), where=np.abs(denominator) > 1e-12)
+    return sample_rate / (lag + np.clip(offset, -0.5, 0.5)), clarity
+
+
+def compute_features(samples, sample_rate):
+    """Compute duration, energy, pitch, perturbation, pause and MFCC statistics for one clip.
+
+    Jitter and shimmer are frame-level approximations: relative differences of
+    consecutive voiced-frame periods and peak amplitudes.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    duration = len(samples) / float(sample_rate)
+    features = {'duration': duration, 'rms_energy': None, 'f0_mean': None, 'f0_std': None,
+                'jitter': None, 'shimmer': None, 'pause_ratio': None, 'mfcc_means': None}
+    if len(samples) == 0:
+        return features
+
+    features['rms_energy'] = float(np.sqrt(np.mean(samples ** 2)))
+
+    hop = int(0.010 * sample_rate)
+    frames = _frames(samples, int(0.025 * sample_rate), hop)
+    frame_rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    silence_threshold = np.percentile(frame_rms, 95) * 10 ** (-30 / 20.0)
+    silent = frame_rms <= silence_threshold
+    features['pause_ratio'] = float(silent.mean())
+
+    pitch_frames = _frames(samples, int(0.040 * sample_rate), hop)
+    f0, clarity = _pitch(pitch_frames, sample_rate)
+    pitch_rms = np.sqrt(np.mean(pitch_frames ** 2, axis=1))
+    voiced = (clarity > 0.5) & (pitch_rms > silence_threshold)
+    if voiced.any():
+        voiced_f0 = f0[voiced]
+        features['f0_mean'] = float(voiced_f0.mean())
+        features['f0_std'] = float(voiced_f0.std())
+
+        # Only compare neighbours that are both voiced
+        pairs = voiced[1:] & voiced[:-1]
+        if pairs.any():
+            periods = 1.0 / f0
+            amplitudes = np.abs(pitch_frames).max(axis=1)
+            features['jitter'] = float(np.abs(np.diff(periods))[pairs].mean() / periods[voiced].mean())
+            features['shimmer'] = float(np.abs(np.diff(amplitudes))[pairs].mean() / amplitudes[voiced].mean())
+
+    n_fft = 512
+    emphasized = np.append(samples[0], samples[1:] - 0.97 * samples[:-1])
+    mfcc_frames = _frames(emphasized, int(0.025 * sample_rate), hop) * np.hamming(int(0.025 * sample_rate))
+    power = np.abs(np.fft.rfft(mfcc_frames, n=n_fft, axis=1)) ** 2 / n_fft
+    mel_energy = power @ _mel_filterbank(sample_rate, n_fft, N_MELS).T
+    log_mel = np.log(np.maximum(mel_energy, 1e-10))
+    mfcc = log_mel @ _dct_matrix(N_MFCC, N_MELS).T
+    features['mfcc_means'] = [float(value) for value in mfcc.mean(axis=0)]
+    return features